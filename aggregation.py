@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+# Dimension temporelle dérivée de la colonne "Date"
+MOIS_COL = "Mois"
+# Mesure de comptage ajoutée à chaque cellule du cube
+NB_COL = "Nb événements"
+
+
+def frame_fingerprint(df: pd.DataFrame) -> int:
+    """Empreinte vectorisée d'un DataFrame (sert de clé de cache du cube)."""
+    if df.empty:
+        return 0
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return int(np.bitwise_xor.reduce(hashes * np.arange(1, len(hashes) + 1, dtype=np.uint64)))
+
+
+def _with_month(df: pd.DataFrame, dimensions: list[str]) -> pd.DataFrame:
+    if MOIS_COL in dimensions and MOIS_COL not in df.columns and "Date" in df.columns:
+        # Mois catégoriel "AAAA-MM" : seuls les mois distincts sont formatés
+        months = pd.to_datetime(df["Date"]).to_numpy().astype("datetime64[M]")
+        valid = ~np.isnat(months)
+        uniques, codes = np.unique(months[valid], return_inverse=True)
+        all_codes = np.full(len(months), -1, dtype=np.int64)
+        all_codes[valid] = codes
+        labels = pd.Index(np.datetime_as_string(uniques, unit="M"), dtype="str")
+        df = df.assign(**{MOIS_COL: pd.Categorical.from_codes(all_codes, categories=labels)})
+    return df
+
+
+class AggregationCube:
+    """
+    Cube d'agrégats pré-calculé à partir d'un résultat d'extraction.
+
+    Chaque cellule correspond à une combinaison unique des dimensions
+    (ex: Client x Mois x Projet) et porte la somme des mesures numériques
+    (heures, montants...) et le nombre d'événements. Toute synthèse
+    (roll-up) ou exploration (drill-down) sur un sous-ensemble de ces
+    dimensions se calcule ensuite sur le cube, bien plus petit que les données.
+    """
+
+    def __init__(self, dimensions: list[str], measures: list[str], cells: pd.DataFrame):
+        self.dimensions = dimensions
+        self.measures = measures
+        self.cells = cells
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, dimensions: list[str], measures: list[str] = None):
+        """Construit le cube à partir d'un DataFrame (df_final)."""
+        df = _with_month(df, dimensions)
+        dimensions = [d for d in dimensions if d in df.columns]
+        if measures is None:
+            measures = df.select_dtypes(include=[np.number]).columns.tolist()
+        measures = [m for m in measures if m in df.columns and m not in dimensions]
+        return cls(dimensions, measures, cls._aggregate(df, dimensions, measures))
+
+    @staticmethod
+    def _aggregate(df: pd.DataFrame, dimensions: list[str], measures: list[str]) -> pd.DataFrame:
+        # Les mesures sont sommées en float64 pour ne pas perdre de précision
+        frame = df[dimensions].copy()
+        for m in measures:
+            frame[m] = pd.to_numeric(df[m], errors="coerce").astype("float64")
+        frame[NB_COL] = 1
+
+        if not dimensions:
+            return frame[measures + [NB_COL]].sum().to_frame().T
+
+        grouped = frame.groupby(dimensions, dropna=False, observed=True, sort=False)
+        return grouped[measures + [NB_COL]].sum().reset_index()
+
+    def rollup(self, dimensions: list[str], dropna: bool = False, missing_label: str = None) -> pd.DataFrame:
+        """Agrège le cube sur un sous-ensemble de ses dimensions."""
+        return self.drilldown({}, dimensions, dropna=dropna, missing_label=missing_label)
+
+    def drilldown(self, filters: dict, dimensions: list[str], dropna: bool = False,
+                  missing_label: str = None) -> pd.DataFrame:
+        """
+        Restreint le cube aux cellules correspondant à `filters` ({dimension: valeur})
+        puis agrège sur `dimensions`.
+
+        Par défaut, les événements sans valeur pour une dimension (règle non
+        reconnue) forment leur propre groupe : la somme des groupes égale les
+        totaux. `missing_label` (ex: "(vide)") remplace alors la valeur absente.
+        """
+        unknown = [d for d in list(filters) + list(dimensions) if d not in self.dimensions]
+        if unknown:
+            raise KeyError(f"Dimensions absentes du cube : {unknown}")
+
+        cells = self.cells
+        for dim, value in filters.items():
+            cells = cells[cells[dim] == value]
+
+        values = self.measures + [NB_COL]
+        if not dimensions:
+            return cells[values].sum().to_frame().T
+
+        grouped = (
+            cells.groupby(list(dimensions), dropna=dropna, observed=True)[values]
+            .sum()
+            .reset_index()
+        )
+        if missing_label is not None:
+            for dim in dimensions:
+                column = grouped[dim]
+                if not column.isna().any():
+                    continue
+                if isinstance(column.dtype, pd.CategoricalDtype) and missing_label not in column.cat.categories:
+                    column = column.cat.add_categories([missing_label])
+                grouped[dim] = column.fillna(missing_label)
+        return grouped
+
+    def totals(self) -> pd.Series:
+        """Totaux globaux de chaque mesure (pour les KPI)."""
+        return self.cells[self.measures + [NB_COL]].sum()
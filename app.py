@@ -1,17 +1,98 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 from datetime import datetime, timedelta
-import io
 import requests
 
 # Imports des modules locaux
 from translations import TRANSLATIONS
-from utils import parse_ics, extraire_informations_agenda
-from oauth import get_calendar_service, list_calendars, get_events_from_calendar, get_auth_url, get_credentials_from_code
-from oauth import get_calendar_service, list_calendars, get_events_from_calendar
-from invoice import get_services, extract_id_from_url, generate_invoice
-from sheets import get_sheets_service, get_sheet_data, extract_spreadsheet_id
+from utils import extraire_informations_agenda, filtrer_evenements_periode
+from rules import analyser_complexite
+from oauth import get_calendar_service, list_calendars, get_auth_url, get_credentials_from_code
+from credentials import get_credential_manager, current_session_owner
+from calendar_fetch import FetchedRangeCache, derive_query_prefilter, fetch_period
+from archive import get_event_archive
+from invoice import get_services, extract_id_from_url, generate_invoice, build_invoice_payloads
+from sheets import get_sheets_service, get_sheet_data, extract_spreadsheet_id, enrichir_donnees
+from aggregation import AggregationCube, MOIS_COL, frame_fingerprint
+from grid import ResultGrid, PAGE_SIZES, page_count
+from export import EXPORT_FORMATS, export_reader, export_filename
+from datetimes import DEFAULT_TZ, TIMEZONES
+from snapshots import SnapshotStore, snapshot_key, rules_hash
+from ical_feed import get_ical_feeds, feed_scope
+from shared_cache import (
+    get_shared_cache, credential_scope, calendar_scope, CALENDAR_LIST_TTL, RANGES_TTL, SHEET_TTL,
+)
+from instrumentation import Instrumentation, use as use_instrumentation, stage
+
+def render_export(df, base_name, key):
+    """Sélecteur de format + bouton de téléchargement (export généré au clic, par tranches)."""
+    labels = {"csv": t["dl_csv"], "xlsx": t["dl_excel"], "parquet": t["dl_parquet"]}
+    c_fmt, c_btn = st.columns([1, 2])
+    with c_fmt:
+        fmt = st.selectbox(t["export_format"], options=list(EXPORT_FORMATS), key=f"fmt_{key}")
+    with c_btn:
+        st.download_button(
+            labels[fmt],
+            # Callable : l'export n'est construit que lorsque l'utilisateur clique, le fichier est transmis tel quel
+            data=lambda: export_reader(df, fmt, sheet_name=base_name),
+            file_name=export_filename(base_name, fmt),
+            mime=EXPORT_FORMATS[fmt]["mime"],
+            key=f"dl_{key}",
+        )
+
+def render_grid(grid, key, filter_dims=(), cube=None, sort_by=None, descending=False):
+    """
+    Grille de résultats paginée : recherche, filtres et tri sont exécutés côté
+    serveur (ResultGrid), seule la page visible est envoyée au navigateur.
+    Les totaux de la sélection proviennent du cube d'agrégation.
+    """
+    columns = grid.columns
+    c_search, c_sort, c_order, c_size = st.columns([3, 2, 1, 1])
+    with c_search:
+        search = st.text_input(t["grid_search"], key=f"search_{key}")
+    with c_sort:
+        sort_options = [""] + columns
+        sort_by = st.selectbox(t["grid_sort"], options=sort_options,
+                               index=sort_options.index(sort_by) if sort_by in columns else 0,
+                               format_func=lambda c: c or "—", key=f"sort_{key}")
+    with c_order:
+        descending = st.checkbox(t["grid_descending"], value=descending, key=f"desc_{key}")
+    with c_size:
+        page_size = st.selectbox(t["grid_page_size"], options=PAGE_SIZES, key=f"size_{key}")
+
+    filters = {}
+    if cube is not None and filter_dims:
+        filter_cols = st.columns(len(filter_dims))
+        for col, dim in zip(filter_cols, filter_dims):
+            with col:
+                options = sorted(cube.cells[dim].dropna().astype(str).unique())
+                value = st.selectbox(dim, options=[""] + options, format_func=lambda v: v or t["grid_all"],
+                                     key=f"filter_{key}_{dim}")
+            if value:
+                filters[dim] = value
+
+    positions = grid.query(search, filters, sort_by or None, ascending=not descending)
+    nb_pages = page_count(len(positions), page_size)
+    # La sélection a pu rétrécir : on revient sur une page existante avant de créer le widget
+    if st.session_state.get(f"page_{key}", 1) > nb_pages:
+        st.session_state[f"page_{key}"] = 1
+
+    c_page, c_info = st.columns([1, 3])
+    with c_page:
+        page_number = st.number_input(t["grid_page"], min_value=1, max_value=nb_pages, step=1, key=f"page_{key}")
+    start = (page_number - 1) * page_size
+    with c_info:
+        st.caption(t["grid_rows"].format(min(start + 1, len(positions)), min(start + page_size, len(positions)), len(positions)))
+
+    st.dataframe(grid.page(positions, page_number, page_size), use_container_width=True)
+
+    if cube is not None and cube.measures:
+        # Totaux de la sélection : depuis le cube si seuls des filtres de dimension s'appliquent
+        if search:
+            selection = AggregationCube.from_frame(grid.df.take(positions), [], cube.measures).totals()
+        else:
+            selection = cube.drilldown(filters, []).iloc[0]
+        st.caption(" · ".join(t["grid_total"].format(m, selection[m]) for m in cube.measures))
 
 # --- Configuration de la page Streamlit ---
 st.set_page_config(page_title="PatternCal", layout="wide", page_icon="📅")
@@ -36,6 +117,16 @@ with st.sidebar:
 
 t = TRANSLATIONS[st.session_state.lang]
 
+# --- Instrumentation (panneau "performance" rempli en fin de script) ---
+if 'instrumentation' not in st.session_state:
+    st.session_state.instrumentation = Instrumentation()
+with st.sidebar:
+    st.session_state.instrumentation.enabled = st.checkbox(t["perf_enable"], value=False)
+    perf_panel = st.container()
+instrumentation = use_instrumentation(st.session_state.instrumentation)
+instrumentation.reset()
+result_memory = None  # mémoire du résultat avant / après le plan de types (dtypes.py)
+
 # --- Initialisation Session State (Données) ---
 if 'regex_config' not in st.session_state:
     st.session_state.regex_config = [
@@ -46,6 +137,22 @@ if 'regex_config' not in st.session_state:
 if 'raw_events' not in st.session_state:
     st.session_state.raw_events = None
 
+# Cache partagé entre sessions (agendas, Sheets, extractions), cloisonné par compte / ACL
+shared_cache = get_shared_cache()
+
+snapshot_store = SnapshotStore()
+
+# Snapshot choisi au tour précédent : on restaure période, règles et Sheet avant la création des widgets
+if 'pending_snapshot' in st.session_state:
+    snap_meta = st.session_state.pop('pending_snapshot')
+    st.session_state.date_debut = datetime.fromisoformat(snap_meta["date_debut"]).date()
+    st.session_state.date_fin = datetime.fromisoformat(snap_meta["date_fin"]).date()
+    st.session_state.sheet_url = snap_meta.get("enrichment", "")
+    st.session_state.report_tz = snap_meta.get("tz", DEFAULT_TZ)
+    st.session_state.regex_config = snap_meta["regex_config"]
+    for widget_key in [k for k in st.session_state if str(k).startswith(("name_", "pattern_", "type_"))]:
+        del st.session_state[widget_key]
+
 # --- Zone Principale : Layout ---
 
 st.title(t["main_title"])
@@ -54,6 +161,28 @@ st.markdown(t["description"])
 # Ligne 1 : Import (Gauche) et Dates (Droite)
 col_top_left, col_top_right = st.columns([1, 1], gap="large")
 
+# La période est lue avant la source : elle pilote la fenêtre de récupération côté serveur
+with col_top_right:
+    st.subheader(t["period"])
+    c_d1, c_d2 = st.columns(2)
+    today = datetime.now().date()
+    m_1 = today - timedelta(days=30)
+    
+    if 'date_debut' not in st.session_state:
+        st.session_state.date_debut = m_1
+    if 'date_fin' not in st.session_state:
+        st.session_state.date_fin = today
+    
+    with c_d1:
+        date_debut = st.date_input(t["date_start"], key="date_debut")
+    with c_d2:
+        date_fin = st.date_input(t["date_end"], key="date_fin")
+
+    # Fuseau de restitution : dates affichées, filtre de période et regroupement par mois
+    if 'report_tz' not in st.session_state:
+        st.session_state.report_tz = DEFAULT_TZ
+    report_tz = st.selectbox(t["timezone"], options=TIMEZONES, key="report_tz")
+
 with col_top_left:
     st.subheader(t["source"])
     
@@ -66,39 +195,143 @@ with col_top_left:
         # En local sans secrets.toml, st.secrets peut lever une erreur
         pass
 
+    credential_manager = get_credential_manager()
+
     # Gestion du Retour OAuth (Callback)
     if "code" in st.query_params:
         code = st.query_params["code"]
         creds = get_credentials_from_code(code, redirect_uri)
         if creds:
+            # Enregistrement dans le gestionnaire (refresh anticipé + cache chiffré)
+            sid = credential_manager.new_session_id()
+            credential_manager.register(sid, creds, owner=current_session_owner())
+            # L'identifiant reste dans l'état de session : jamais dans l'URL (historique, logs, partage)
             st.session_state.google_creds = creds
+            st.session_state.google_sid = sid
             st.query_params.clear()
             st.rerun()
         else:
             st.error("Erreur lors de l'authentification.")
 
+    # Anciennes URL porteuses d'un identifiant : il est retiré sans être utilisé
+    if "sid" in st.query_params:
+        del st.query_params["sid"]
+
+    # Credentials relus auprès du gestionnaire : oubliés par lui (session expirée, token révoqué) -> déconnexion
+    if 'google_sid' in st.session_state:
+        creds = credential_manager.get(st.session_state.google_sid)
+        if creds:
+            st.session_state.google_creds = creds
+        else:
+            del st.session_state.google_sid
+            st.session_state.pop('google_creds', None)
+
     # Vérification si connecté
     service = None
+    user_scope = None
+    # Portées que la session peut présenter (compte, agendas listés, flux iCal) : elles filtrent les snapshots
+    # (plus celles du snapshot chargé, vérifiées au chargement : le flux iCal n'est alors plus conservé)
+    session_scopes = set(st.session_state.get('snapshot_scopes', ()))
     if 'google_creds' in st.session_state:
-         service = get_calendar_service(st.session_state.google_creds)
+         service = get_calendar_service(
+             st.session_state.google_creds,
+             lock=credential_manager.lock(st.session_state.google_sid) if 'google_sid' in st.session_state else None,
+         )
+         user_scope = credential_scope(st.session_state.google_creds)
+         session_scopes.add(user_scope)
     
     if service:
         st.success("✅ Connecté à Google Calendar")
         if st.button("Se déconnecter"):
+            if 'google_sid' in st.session_state:
+                credential_manager.forget(st.session_state.google_sid)
+                del st.session_state.google_sid
+            shared_cache.invalidate(user_scope)
+            st.session_state.pop('calendar_id', None)
+            st.session_state.pop('source_scope', None)
+            st.session_state.pop('snapshot_scopes', None)
+            st.session_state.pop('snapshot_key', None)
             del st.session_state.google_creds
             st.rerun()
         
         # Listing Agendas
         try:
-            cals = list_calendars(service)
+            cals = shared_cache.get_or_compute(user_scope, "calendars", lambda: list_calendars(service),
+                                               ttl=CALENDAR_LIST_TTL)
             cal_options = {c['summary']: c['id'] for c in cals}
+            cal_by_id = {c['id']: c for c in cals}
+            session_scopes.update(calendar_scope(c) for c in cals)
             selected_cal_name = st.selectbox(t["select_cal"], list(cal_options.keys()))
+
+            # Pré-filtre serveur : uniquement sur demande explicite, pour les événements d'une seule règle
+            query_terms = derive_query_prefilter(st.session_state.regex_config)
+            query_rule = None
+            if query_terms:
+                query_rule = st.selectbox(
+                    t["server_filter"], options=[None] + list(query_terms),
+                    format_func=lambda name: t["server_filter_none"] if name is None
+                    else t["server_filter_rule"].format(name, query_terms[name]),
+                )
+            query_term = query_terms.get(query_rule)
+            if query_term:
+                st.warning(t["server_filter_warning"].format(query_rule, query_term))
             
             if st.button(t["load_cal_btn"]):
-                cal_id = cal_options[selected_cal_name]
-                events = get_events_from_calendar(service, cal_id, days_back=90)
+                st.session_state.calendar_id = cal_options[selected_cal_name]
+                st.session_state.source_id = f"calendar:{st.session_state.calendar_id}"
+                st.session_state.source_label = selected_cal_name
+                st.session_state.pop('snapshot_key', None)
+                st.session_state.pop('snapshot_scopes', None)
+                st.session_state.pop('ical_url', None)
+                st.session_state.loaded_now = True
+
+            # Une fois l'agenda choisi, chaque changement de période ne récupère que les tranches manquantes
+            # Les tranches déjà récupérées par un collègue ayant le même accès à l'agenda sont réutilisées
+            if st.session_state.get('calendar_id') and st.session_state.calendar_id not in cal_by_id:
+                # Agenda retiré de la liste du compte : plus d'accès aux données partagées
+                st.session_state.pop('calendar_id', None)
+                st.session_state.pop('source_scope', None)
+            elif st.session_state.get('calendar_id') and date_debut and date_fin:
+                cal_scope = calendar_scope(cal_by_id[st.session_state.calendar_id])
+                q = query_term
+                with stage("calendar_fetch") as rec:
+                    with shared_cache.lock(cal_scope, "ranges"):
+                        fetch_cache = shared_cache.get(cal_scope, "ranges")
+                        if fetch_cache is None:
+                            fetch_cache = shared_cache.put(cal_scope, "ranges", FetchedRangeCache(),
+                                                           ttl=RANGES_TTL, dedup=False)
+                        events, nb_slices = fetch_period(
+                            service,
+                            st.session_state.calendar_id,
+                            date_debut,
+                            date_fin,
+                            fetch_cache,
+                            q=q,
+                            tz=report_tz,
+                            archive=get_event_archive(),
+                            archive_scope=cal_scope,
+                        )
+                        if nb_slices:
+                            shared_cache.resize(cal_scope, "ranges")
+                    rec["rows"] = len(events)
                 st.session_state.raw_events = events
-                st.success(t["success_load"])
+                st.session_state.source_scope = (cal_scope, fetch_cache.generation, q)
+                if st.session_state.pop('loaded_now', False) or nb_slices:
+                    st.success(t["success_load"])
+
+                # Archive locale de l'agenda : statistiques par mois (sans lire les partitions)
+                archive_parts = get_event_archive().partitions(cal_scope)
+                if not archive_parts.empty:
+                    with st.expander(t["archive"]):
+                        st.caption(t["archive_info"].format(
+                            len(archive_parts), int(archive_parts["closed"].sum()), int(archive_parts["nb_events"].sum()),
+                        ))
+                        by_year = (
+                            archive_parts.assign(year=archive_parts["month"].str[:4])
+                            .groupby("year")[["nb_events", "hours"]].sum()
+                        )
+                        st.dataframe(by_year, use_container_width=True)
+                        st.dataframe(archive_parts, use_container_width=True, hide_index=True)
         except Exception as e:
             st.error(f"Erreur API: {e}")
 
@@ -112,16 +345,68 @@ with col_top_left:
         else:
             st.error("Erreur inconnue.")
 
-with col_top_right:
-    st.subheader(t["period"])
-    c_d1, c_d2 = st.columns(2)
-    today = datetime.now().date()
-    m_1 = today - timedelta(days=30)
-    
-    with c_d1:
-        date_debut = st.date_input(t["date_start"], value=m_1)
-    with c_d2:
-        date_fin = st.date_input(t["date_end"], value=today)
+    # Lien iCal privé (adresse secrète) : flux partagé entre sessions, revalidé par requête conditionnelle
+    with st.expander(t["tab_link"], expanded=bool(st.session_state.get('ical_url'))):
+        ical_url = st.text_input(t["url_label"], placeholder=t["url_placeholder"], help=t["url_help"],
+                                 type="password", key="ical_url_input")
+        if st.button(t["load_btn"]) and ical_url.strip():
+            st.session_state.ical_url = ical_url.strip()
+            # L'URL secrète n'est jamais enregistrée : la source est identifiée par son empreinte
+            st.session_state.source_id = feed_scope(ical_url)
+            st.session_state.source_label = t["tab_link"]
+            st.session_state.pop('calendar_id', None)
+            st.session_state.pop('snapshot_key', None)
+            st.session_state.pop('snapshot_scopes', None)
+            st.session_state.loaded_now = True
+
+    if st.session_state.get('ical_url'):
+        loaded_now = st.session_state.pop('loaded_now', False)
+        try:
+            with stage("ical_fetch") as rec:
+                events, version = get_ical_feeds().get(st.session_state.ical_url, force=loaded_now)
+                rec["rows"] = len(events)
+            st.session_state.raw_events = events
+            st.session_state.source_scope = (feed_scope(st.session_state.ical_url), version, None)
+            session_scopes.add(feed_scope(st.session_state.ical_url))
+            if loaded_now:
+                st.success(t["success_load"])
+        except requests.RequestException as e:
+            # Les exceptions requests contiennent l'URL : seul le code HTTP est affiché
+            st.error(t["error_load"].format(e.response.status_code if e.response is not None else type(e).__name__))
+            st.session_state.pop('ical_url', None)
+            st.session_state.pop('source_scope', None)
+        except ValueError as e:
+            st.error(str(e))
+            st.session_state.pop('ical_url', None)
+            st.session_state.pop('source_scope', None)
+
+    # Snapshots (Arrow) enregistrés sur ce serveur : rechargement instantané, partage entre collègues
+    snapshots_meta = snapshot_store.list(session_scopes)
+    if snapshots_meta:
+        with st.expander(t["snapshots"]):
+            snap_options = {m["key"]: m for m in snapshots_meta}
+            selected_snap = st.selectbox(
+                t["snapshot_select"],
+                options=list(snap_options),
+                format_func=lambda k: t["snapshot_item"].format(
+                    snap_options[k].get("source_label", snap_options[k]["source"]),
+                    snap_options[k]["date_debut"],
+                    snap_options[k]["date_fin"],
+                    snap_options[k]["nb_events"],
+                ),
+            )
+            if st.button(t["snapshot_load"]):
+                snap_meta = snap_options[selected_snap]
+                st.session_state.raw_events = snapshot_store.load_events(selected_snap, session_scopes)
+                st.session_state.pending_snapshot = snap_meta
+                st.session_state.snapshot_scopes = snap_meta["scopes"]
+                st.session_state.snapshot_key = selected_snap
+                st.session_state.source_id = snap_meta["source"]
+                st.session_state.source_label = snap_meta.get("source_label", snap_meta["source"])
+                st.session_state.pop('calendar_id', None)
+                st.session_state.pop('ical_url', None)
+                st.session_state.pop('source_scope', None)
+                st.rerun()
 
 st.divider()
 
@@ -144,6 +429,9 @@ for i, config in enumerate(st.session_state.regex_config):
     with c2:
         new_pattern = st.text_input(f"Regex chp {i}", value=config["pattern"], label_visibility="collapsed", key=f"pattern_{i}", placeholder=t["placeholder_regex"])
         st.session_state.regex_config[i]["pattern"] = new_pattern
+        risques = analyser_complexite(new_pattern)
+        if risques:
+            st.caption(t["rule_risky"].format(", ".join(risques)))
     with c3:
         new_type = st.selectbox(f"Type chp {i}", options=["text", "number"], index=0 if config["type"]=="text" else 1, label_visibility="collapsed", key=f"type_{i}")
         st.session_state.regex_config[i]["type"] = new_type
@@ -178,86 +466,97 @@ st.divider()
 
 # --- Etape 3 : Enrichissement Données (Google Sheet) ---
 st.subheader("3. Enrichissement de données (Optionnel)")
-sheet_url = st.text_input("URL Google Sheet pour enrichissement", placeholder="https://docs.google.com/spreadsheets/d/...")
+sheet_url = st.text_input("URL Google Sheet pour enrichissement", placeholder="https://docs.google.com/spreadsheets/d/...", key="sheet_url")
 
-if sheet_url:
-    if 'google_creds' not in st.session_state:
-         st.warning("Veuillez vous connecter à Google (Step 1) pour lire la Google Sheet.")
-    else:
-        try:
-             # Lecture Sheet
-             sheet_service = get_sheets_service(st.session_state.google_creds)
-             sheet_id = extract_spreadsheet_id(sheet_url)
-             df_sheet = get_sheet_data(sheet_service, sheet_id)
-             
-             if not df_sheet.empty:
-                 # Tentative de fusion
-                 # On cherche une colonne commune entre df_final (qui n'existe pas encore ici, c'est le hic)
-                 # On doit enrichir df_final APRES l'extraction.
-                 pass
-             else:
-                 st.info("La Google Sheet semble vide ou illisible.")
-        except Exception as e:
-             st.error(f"Erreur lecture Sheet: {e}")
+if sheet_url and 'google_creds' not in st.session_state:
+    st.warning("Veuillez vous connecter à Google (Step 1) pour lire la Google Sheet.")
 
 if st.session_state.raw_events is not None:
     # Les événements sont déjà parsés et stockés dans raw_events
     raw_events = st.session_state.raw_events
         
     # Filtrage par date
-    events_filtrés = []
-    for evt in raw_events:
-        dt_evt = evt["dtstart"]
-        if isinstance(dt_evt, datetime):
-            date_evt = dt_evt.date()
-        else:
-            date_evt = dt_evt
-        
-        in_range = True
-        if date_debut and date_evt < date_debut:
-            in_range = False
-        if date_fin and date_evt > date_fin:
-            in_range = False
-        
-        if in_range:
-            events_filtrés.append(evt)
+    with stage("date_filter") as rec:
+        events_filtrés = filtrer_evenements_periode(raw_events, date_debut, date_fin, tz=report_tz)
+        rec["rows"] = len(events_filtrés)
 
     st.success(t["found_events"].format(len(events_filtrés), len(raw_events)))
     
-    # Extraction intelligente (utils)
-    df_final = extraire_informations_agenda(
-        events_filtrés, 
-        st.session_state.regex_config
+    # Portées requises pour relire ce résultat : source (agenda au niveau d'accès courant, ou flux),
+    # plus le compte si une Sheet l'enrichit
+    if st.session_state.get('source_scope'):
+        current_snapshot_scopes = {st.session_state.source_scope[0]}
+    else:
+        current_snapshot_scopes = set(st.session_state.get('snapshot_scopes', ()))
+    if sheet_url and user_scope:
+        current_snapshot_scopes.add(user_scope)
+    current_snapshot_key = snapshot_key(
+        st.session_state.get('source_id', ''), date_debut, date_fin,
+        st.session_state.regex_config, sheet_url, report_tz, current_snapshot_scopes,
     )
+
+    if st.session_state.get('snapshot_key') == current_snapshot_key:
+        # Résultat relu depuis le snapshot (memory-map) : ni extraction ni enrichissement
+        df_final = snapshot_store.load_result(current_snapshot_key, session_scopes)
+        # Identité du résultat : cube et grilles ne sont reconstruits que lorsqu'elle change
+        result_key = ("snapshot", current_snapshot_key)
+        st.info(t["snapshot_used"])
+    else:
+        # Extraction intelligente (utils), partagée entre sessions ayant le même accès à l'agenda
+        with stage("extraction") as rec:
+            compute_extraction = lambda: extraire_informations_agenda(
+                events_filtrés, 
+                st.session_state.regex_config,
+                tz=report_tz,
+            )
+            if st.session_state.get('source_scope'):
+                cal_scope, *source_state = st.session_state.source_scope
+                extraction_key = ("extraction", *source_state, date_debut, date_fin, report_tz,
+                                  rules_hash(st.session_state.regex_config))
+                df_final = shared_cache.get_or_compute(cal_scope, extraction_key, compute_extraction)
+                result_key = (cal_scope, *extraction_key)
+            else:
+                df_final = compute_extraction()
+                # Événements propres à la session (snapshot relu) : identifiés par l'objet en session
+                result_key = ("events", st.session_state.get('snapshot_key'), id(raw_events), len(raw_events),
+                              date_debut, date_fin, report_tz,
+                              rules_hash(st.session_state.regex_config))
+            rec["rows"] = len(df_final)
+            result_memory = df_final.attrs.get("memoire")
+            if result_memory:
+                rec["bytes"] = result_memory["apres"]
+        for message in df_final.attrs.get("regles_desactivees", {}).values():
+            st.warning(message)
     
-    # --- LOGIQUE ENRICHISSEMENT ---
-    # Si on a chargé une sheet valide plus haut
-    if sheet_url and 'google_creds' in st.session_state:
-          try:
-             sheet_service = get_sheets_service(st.session_state.google_creds)
-             sheet_id = extract_spreadsheet_id(sheet_url)
-             df_sheet = get_sheet_data(sheet_service, sheet_id)
+        # --- LOGIQUE ENRICHISSEMENT ---
+        if sheet_url and 'google_creds' in st.session_state:
+              try:
+                 sheet_service = get_sheets_service(st.session_state.google_creds)
+                 sheet_id = extract_spreadsheet_id(sheet_url)
+                 with stage("sheet_read") as rec:
+                     df_sheet = shared_cache.get_or_compute(
+                         user_scope, ("sheet", sheet_id), lambda: get_sheet_data(sheet_service, sheet_id), ttl=SHEET_TTL
+                     )
+                     rec["rows"] = len(df_sheet)
              
-             if not df_sheet.empty and not df_final.empty:
-                 # Intersection des colonnes
-                 cats_cols = set(df_final.columns)
-                 sheet_cols = set(df_sheet.columns)
-                 common = list(cats_cols.intersection(sheet_cols))
+                 if not df_sheet.empty and not df_final.empty:
+                     with stage("enrichment") as rec:
+                         df_enrichi, pivot_col = enrichir_donnees(df_final, df_sheet)
+                         rec["rows"] = len(df_enrichi)
                  
-                 if common:
-                     pivot_col = common[0] # On prend la première trouvée
-                     st.info(f"Fusion des données sur la colonne clé : **{pivot_col}**")
-                     
-                     # Left Join
-                     df_final = pd.merge(df_final, df_sheet, on=pivot_col, how='left')
-                     st.success("Données enrichies avec succès !")
-                 else:
-                     st.warning(f"Aucune colonne commune trouvée entre l'agenda {list(df_final.columns)} et la Sheet {list(df_sheet.columns)}.")
-          except Exception as e:
-                # Déjà affiché plus haut, ou on gère silence ici
-                pass
+                     if pivot_col:
+                         st.info(f"Fusion des données sur la colonne clé : **{pivot_col}**")
+                         df_final = df_enrichi
+                         # La Sheet (petite) est identifiée par son contenu : une mise à jour reconstruit le cube
+                         result_key = (*result_key, "sheet", sheet_id, frame_fingerprint(df_sheet))
+                         st.success("Données enrichies avec succès !")
+                     else:
+                         st.warning(f"Aucune colonne commune trouvée entre l'agenda {list(df_final.columns)} et la Sheet {list(df_sheet.columns)}.")
+                 elif df_sheet.empty:
+                     st.info("La Google Sheet semble vide ou illisible.")
+              except Exception as e:
+                    st.error(f"Erreur lecture Sheet: {e}")
 
-    
     if not df_final.empty:
         st.subheader(t["results"])
         
@@ -269,26 +568,66 @@ if st.session_state.raw_events is not None:
         elif "Client" in [c["name"] for c in st.session_state.regex_config]:
                 col_client = "Client"
 
+        # Cube d'agrégation : construit une seule fois par résultat (clé d'extraction, snapshot ou Sheet)
+        cube_dims = []
+        if col_client and col_client in df_final.columns:
+            cube_dims.append(col_client)
+        for config in st.session_state.regex_config:
+            if config["type"] == "text" and config["name"] in df_final.columns and config["name"] not in cube_dims:
+                cube_dims.append(config["name"])
+        cube_dims.append(MOIS_COL)
+
+        cube_key = (result_key, tuple(cube_dims))
+        if st.session_state.get('cube_key') != cube_key:
+            with stage("aggregation") as rec:
+                st.session_state.cube = AggregationCube.from_frame(df_final, cube_dims)
+                rec["rows"] = len(st.session_state.cube.cells)
+            st.session_state.cube_key = cube_key
+            st.session_state.result_grid = ResultGrid(df_final)
+        cube = st.session_state.cube
+
         tab_detail, tab_synthese = st.tabs([t["tab_detail"], t["tab_synthesis"]])
         
         with tab_detail:
-            st.dataframe(df_final, use_container_width=True)
-            # Export Buttons removed as requested
+            render_grid(st.session_state.result_grid, "detail",
+                        filter_dims=[d for d in cube.dimensions if d != MOIS_COL], cube=cube)
+            render_export(df_final, "patterncal_detail", "detail")
 
         with tab_synthese:
             if col_client and col_client in df_final.columns:
-                # Agrégation
-                numeric_cols = df_final.select_dtypes(include=[np.number]).columns.tolist()
-                df_grouped = df_final.groupby(col_client)[numeric_cols].sum().reset_index()
-                
-                if "Durée (h)" in df_grouped.columns:
-                    df_grouped = df_grouped.sort_values("Durée (h)", ascending=False)
-                    
-                st.dataframe(df_grouped, use_container_width=True)
-                # Export Buttons removed as requested
+                # Agrégation (roll-up / drill-down depuis le cube)
+                c_dims, c_filter = st.columns([2, 1])
+                with c_dims:
+                    group_dims = st.multiselect(t["group_by"], options=cube.dimensions, default=[col_client])
+                with c_filter:
+                    clients = sorted(cube.cells[col_client].dropna().astype(str).unique())
+                    focus_client = st.selectbox(t["drilldown_client"], options=[""] + clients)
+
+                filters = {col_client: focus_client} if focus_client else {}
+                df_grouped = cube.drilldown(filters, group_dims, missing_label=t["empty_value"])
+
+                grouped_key = (cube_key, tuple(sorted(filters.items())), tuple(group_dims))
+                if st.session_state.get('grouped_key') != grouped_key:
+                    st.session_state.grouped_grid = ResultGrid(df_grouped)
+                    st.session_state.grouped_key = grouped_key
+                render_grid(st.session_state.grouped_grid, "synthese", sort_by="Durée (h)", descending=True)
+                render_export(df_grouped, "patterncal_synthese", "synthese")
             else:
                 st.info("Aucune colonne 'Client' détectée pour le regroupement. Vérifiez vos règles d'extraction.")
 
+        if current_snapshot_scopes and st.button(t["snapshot_save"]):
+            snapshot_store.save(current_snapshot_key, events_filtrés, df_final, {
+                "source": st.session_state.get('source_id', ''),
+                "source_label": st.session_state.get('source_label', ''),
+                "date_debut": date_debut.isoformat(),
+                "date_fin": date_fin.isoformat(),
+                "regex_config": st.session_state.regex_config,
+                "enrichment": sheet_url,
+                "tz": report_tz,
+            }, current_snapshot_scopes)
+            st.session_state.snapshot_key = current_snapshot_key
+            st.success(t["snapshot_saved"])
+
         st.divider()
         
         # --- Etape 5 : Génération de Factures ---
@@ -317,54 +656,20 @@ if st.session_state.raw_events is not None:
                         progress_bar = st.progress(0)
                         status_text = st.empty()
                         
-                        groups = df_final.groupby(col_client)
-                        total_groups = len(groups)
+                        # Assemblage vectorisé de toutes les factures en une passe
+                        with stage("invoice_payloads") as rec:
+                            payloads = build_invoice_payloads(df_final, col_client)
+                            rec["rows"] = len(payloads)
+                        total_groups = len(payloads)
                         
                         results_links = []
                         
-                        for idx, (client_name, group) in enumerate(groups):
+                        for idx, (client_name, invoice_data) in enumerate(payloads):
                             status_text.text(f"Génération pour {client_name}...")
-                            
-                            # 1. Récupération des données statiques (la première ligne du groupe)
-                            # On convertit la première ligne en dictionnaire pour avoir accès à toutes les colonnes
-                            # (Client, Email, Adresse, etc. venant de l'enrichissement ou du regex)
-                            first_row = group.iloc[0].to_dict()
-                            
-                            # On nettoie les clés (optionnel, mais propre) et les valeurs (NaN -> "")
-                            invoice_data = {k: (v if pd.notna(v) else "") for k, v in first_row.items()}
-                            
-                            # 2. Ajout des Champs Calculés (suffixe _CALC ou noms explicites comme avant)
-                            nb_presta = len(group)
-                            cout_total = 0
-                            # Recherche d'une colonne de montant
-                            for col in group.columns:
-                                if "montant" in col.lower() or "price" in col.lower() or "eur" in col.lower():
-                                     try:
-                                         # On force la conversion en numérique pour éviter la concaténation de str
-                                         cout_total = pd.to_numeric(group[col], errors='coerce').sum()
-                                     except:
-                                         pass
-                                     break
-                            
-                            # Liste des dates
-                            dates = []
-                            for _, row in group.iterrows():
-                                start = row.get("Date")
-                                if start:
-                                     if isinstance(start, (datetime, pd.Timestamp)):
-                                         dates.append(start.strftime("%d/%m/%Y"))
-                                     else:
-                                         dates.append(str(start))
-                            liste_dates = ", ".join(dates)
-                            
-                            # On écrase/ajoute les champs calculés standards
-                            invoice_data["CLIENT_NOM"] = client_name
-                            invoice_data["NOMBRE_PRESTATION"] = nb_presta
-                            invoice_data["COUT_TOTAL"] = f"{cout_total:.2f} €"
-                            invoice_data["LISTE_DATE_PRESTATION"] = liste_dates
 
                             try:
-                                res = generate_invoice(drive_service, docs_service, template_id, folder_id, invoice_data)
+                                with stage("invoice"):
+                                    res = generate_invoice(drive_service, docs_service, template_id, folder_id, invoice_data)
                                 results_links.append(f"- {client_name}: [PDF]({res['pdf_link']})")
                             except Exception as e:
                                 st.error(f"Erreur pour {client_name}: {e}")
@@ -386,19 +691,43 @@ if st.session_state.raw_events is not None:
         # --- KPI Globaux ---
         cols = st.columns(len(st.session_state.regex_config) + 1)
         
-        total_heures = df_final["Durée (h)"].sum()
+        totaux = cube.totals()
+        total_heures = totaux["Durée (h)"]
         cols[0].metric(label=t["total_hours"], value=f"{total_heures:.2f} h")
         
         idx = 1
         for config in st.session_state.regex_config:
-            if config["type"] == "number" and config["name"] in df_final.columns:
-                total = df_final[config["name"]].sum()
+            if config["type"] == "number" and config["name"] in cube.measures:
+                total = totaux[config["name"]]
                 if idx < len(cols):
                     cols[idx].metric(label=t["total_prefix"].format(config['name']), value=f"{total:.2f}")
                 idx += 1
+        source_scope = st.session_state.get('source_scope')
+        if source_scope and source_scope[2]:
+            # Pré-filtre Google actif : ces totaux ne couvrent que les événements contenant le terme
+            st.caption(t["server_filter_kpi"].format(source_scope[2]))
               
     else:
         st.warning(t["no_data"])
         
 else:
-    st.info(t["waiting"])
\ No newline at end of file
+    st.info(t["waiting"])
+
+# --- Panneau performance (sidebar) ---
+if instrumentation.enabled:
+    with perf_panel:
+        with st.expander(t["perf_panel"], expanded=False):
+            st.caption(t["perf_stages"])
+            st.dataframe(instrumentation.stages_frame(), use_container_width=True, hide_index=True)
+            st.caption(t["perf_api"])
+            st.dataframe(instrumentation.api_frame(), use_container_width=True, hide_index=True)
+            cache_info = shared_cache.info()
+            st.caption(t["perf_cache"].format(
+                cache_info["bytes"] / 1024 / 1024, cache_info["max_bytes"] / 1024 / 1024,
+                cache_info["entries"], cache_info["hits"], cache_info["misses"],
+                cache_info["dedup"], cache_info["evictions"],
+            ))
+            if result_memory:
+                st.caption(t["perf_memory"].format(
+                    result_memory["avant"] / 1024 / 1024, result_memory["apres"] / 1024 / 1024,
+                ))
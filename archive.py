@@ -0,0 +1,197 @@
+import os
+import time
+import json
+import hashlib
+import datetime
+import threading
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from datetimes import DEFAULT_TZ, to_epoch_ns, to_local
+from snapshots import events_to_frame, frame_to_events, _write_arrow, _mapped_table
+
+ARCHIVE_DIR = os.path.join(".patterncal", "archive")
+INDEX_FILE = "index.json"
+
+# Un mois est clos (immuable, plus jamais récupéré) une fois ce délai écoulé après sa fin :
+# les corrections de fin de mois (facturation) restent possibles pendant une semaine
+CLOSE_AFTER = datetime.timedelta(days=7)
+# Marge de la requête API autour des mois récupérés (journées entières dans un autre fuseau)
+FETCH_MARGIN = datetime.timedelta(days=1)
+
+
+def _month_bounds_ns(months, tz):
+    """Début de chaque mois "AAAA-MM" et du mois suivant (minuit dans `tz`), en instants UTC (ns)."""
+    firsts = np.array(months, dtype="datetime64[M]")
+    starts, _ = to_epoch_ns([d.item() for d in firsts.astype("datetime64[D]")], tz)
+    ends, _ = to_epoch_ns([d.item() for d in (firsts + 1).astype("datetime64[D]")], tz)
+    return starts, ends
+
+
+def _months_of(epoch_ns, tz):
+    """Mois "AAAA-MM" (dans `tz`) de chaque instant."""
+    return np.datetime_as_string(to_local(epoch_ns, tz).to_numpy("datetime64[M]"), unit="M")
+
+
+def _utc_naive(epoch_ns):
+    return datetime.datetime(1970, 1, 1) + datetime.timedelta(microseconds=int(epoch_ns) // 1000)
+
+
+def _runs(months):
+    """Regroupe des mois triés en suites consécutives (une requête API par suite)."""
+    runs = []
+    for month in months:
+        if runs and np.datetime64(runs[-1][-1], "M") + 1 == np.datetime64(month, "M"):
+            runs[-1].append(month)
+        else:
+            runs.append([month])
+    return runs
+
+
+class EventArchive:
+    """
+    Archive locale des événements normalisés, partitionnée par agenda et par
+    mois (Arrow IPC, un fichier par mois).
+
+    - Chaque agenda a un manifeste (index.json) : pour chaque mois, nombre
+      d'événements, premier / dernier début, heures cumulées, date de
+      récupération et statut. Une requête sur une période n'ouvre que les
+      partitions dont la plage [premier début, dernier début] la recoupe.
+    - Un mois terminé depuis plus de CLOSE_AFTER est clos : sa partition est
+      immuable et n'est plus jamais récupérée. Les mois ouverts sont
+      récupérés à nouveau à chaque demande (une requête par suite de mois).
+    - Le répertoire d'un agenda est dérivé de sa portée (shared_cache.calendar_scope) :
+      archive commune aux comptes ayant le même niveau d'accès.
+
+    Les mois sont ceux du fuseau de l'archive (DEFAULT_TZ à sa création,
+    enregistré dans le manifeste).
+    """
+
+    def __init__(self, root=ARCHIVE_DIR, tz=DEFAULT_TZ, close_after=CLOSE_AFTER):
+        self.root = root
+        self.tz = tz
+        self.close_after = close_after
+        self._locks = {}
+        self._registry_lock = threading.Lock()
+
+    def _dir(self, scope):
+        return os.path.join(self.root, hashlib.sha256(scope.encode()).hexdigest()[:24])
+
+    def _lock_for(self, scope):
+        with self._registry_lock:
+            return self._locks.setdefault(scope, threading.Lock())
+
+    # --- Manifeste ---
+
+    def index(self, scope):
+        path = os.path.join(self._dir(scope), INDEX_FILE)
+        if not os.path.exists(path):
+            return {"tz": self.tz, "partitions": {}}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_index(self, scope, index):
+        path = os.path.join(self._dir(scope), INDEX_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def partitions(self, scope) -> pd.DataFrame:
+        """Statistiques des partitions d'un agenda, une ligne par mois."""
+        columns = ["month", "nb_events", "hours", "all_day", "first_start", "last_start", "fetched", "closed"]
+        parts = self.index(scope)["partitions"]
+        if not parts:
+            return pd.DataFrame(columns=columns)
+        df = pd.DataFrame([dict(stats, month=month) for month, stats in sorted(parts.items())])
+        df["first_start"] = pd.to_datetime(df["start_min_ns"], unit="ns", utc=True)
+        df["last_start"] = pd.to_datetime(df["start_max_ns"], unit="ns", utc=True)
+        return df[columns]
+
+    # --- Écriture ---
+
+    def _write_months(self, scope, index, months, events, now_ns):
+        """Remplace les partitions de `months` par les événements récupérés qui y débutent."""
+        tz = index["tz"]
+        directory = self._dir(scope)
+        os.makedirs(directory, exist_ok=True)
+
+        frame = events_to_frame(events, tz)
+        frame = frame.drop_duplicates("id") if frame["id"].notna().all() else frame
+        start_ns = frame["dtstart"].to_numpy("datetime64[ns]").view(np.int64)
+        event_months = _months_of(start_ns, tz)
+        _, month_ends = _month_bounds_ns(months, tz)
+        close_ns = int(self.close_after / datetime.timedelta(microseconds=1)) * 1000
+
+        for month, month_end in zip(months, month_ends):
+            if index["partitions"].get(month, {}).get("closed"):
+                continue
+            selected = np.flatnonzero(event_months == month)
+            selected = selected[np.argsort(start_ns[selected], kind="stable")]
+            part = frame.take(selected).reset_index(drop=True)
+            _write_arrow(part, os.path.join(directory, f"{month}.arrow"))
+            starts = start_ns[selected]
+            index["partitions"][month] = {
+                "nb_events": len(part),
+                "start_min_ns": int(starts.min()) if len(starts) else None,
+                "start_max_ns": int(starts.max()) if len(starts) else None,
+                "hours": round(float(part["duration_s"].sum()) / 3600, 2),
+                "all_day": int(part["all_day"].sum()),
+                "fetched": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+                "closed": bool(now_ns >= month_end + close_ns),
+            }
+
+    # --- Lecture ---
+
+    def events(self, scope, start, end, fetch, tz=DEFAULT_TZ):
+        """
+        Événements dont le début (dans `tz`) est dans [start, end), par ordre
+        chronologique. Les mois non clos de la période sont d'abord récupérés
+        via `fetch(time_min, time_max)` (datetimes UTC sans fuseau) et archivés.
+
+        Une journée entière est archivée à minuit (fuseau de l'archive) de son
+        jour : elle est retenue si ce jour est dans [start, end), quel que soit `tz`.
+        """
+        lo, hi = to_epoch_ns([start, end], tz)[0]
+        with self._lock_for(scope):
+            index = self.index(scope)
+            archive_tz = index["tz"]
+            day_lo, day_hi = to_epoch_ns([start, end], archive_tz)[0]
+            lo_any, hi_any = min(lo, day_lo), max(hi, day_hi)
+            first, last = _months_of(np.array([lo_any, hi_any - 1]), archive_tz)
+            months = [str(m) for m in np.arange(np.datetime64(first, "M"), np.datetime64(last, "M") + 1)]
+
+            now_ns = time.time_ns()
+            stale = [m for m in months if not index["partitions"].get(m, {}).get("closed")]
+            if stale:
+                for run in _runs(stale):
+                    run_starts, run_ends = _month_bounds_ns([run[0], run[-1]], archive_tz)
+                    fetched = fetch(_utc_naive(run_starts[0]) - FETCH_MARGIN, _utc_naive(run_ends[-1]) + FETCH_MARGIN)
+                    self._write_months(scope, index, run, fetched, now_ns)
+                self._save_index(scope, index)
+
+            frames = []
+            for month in months:
+                part = index["partitions"].get(month)
+                # Partition vide, ou hors de la période d'après ses bornes : pas de lecture
+                if not part or not part["nb_events"] or part["start_max_ns"] < lo_any or part["start_min_ns"] >= hi_any:
+                    continue
+                path = os.path.join(self._dir(scope), f"{month}.arrow")
+                frames.append(_mapped_table(path, os.path.getmtime(path)).to_pandas())
+
+        if not frames:
+            return []
+        df = pd.concat(frames, ignore_index=True)
+        start_ns = df["dtstart"].to_numpy("datetime64[ns]").view(np.int64)
+        all_day = df["all_day"].to_numpy(dtype=bool)
+        timed_in = ~all_day & (start_ns >= lo) & (start_ns < hi)
+        all_day_in = all_day & (start_ns >= day_lo) & (start_ns < day_hi)
+        df = df[timed_in | all_day_in]
+        return frame_to_events(df, archive_tz)
+
+
+@st.cache_resource
+def get_event_archive():
+    """Instance unique de l'archive, partagée entre toutes les sessions."""
+    return EventArchive()
@@ -0,0 +1 @@
+"""Suite de benchmarks PatternCal (données synthétiques et faux services Google)."""
@@ -0,0 +1,122 @@
+"""
+Faux services Google en mémoire (Calendar, Drive, Docs, Sheets).
+
+Ils imitent la forme des objets googleapiclient (`service.x().y(...).execute()`)
+et comptent les appels, sans réseau ni quota.
+"""
+import json
+import itertools
+import httplib2
+from googleapiclient.errors import HttpError
+
+# Verbe HTTP des méthodes imitées (googleapiclient expose le verbe dans `request.method`)
+HTTP_METHODS = {"list": "GET", "get": "GET", "export": "GET",
+                "copy": "POST", "create": "POST", "batchUpdate": "POST"}
+
+
+class FakeRequest:
+    """
+    Requête simulée : le résultat passe par un corps brut puis par `postproc`,
+    comme une HttpRequest. Les statuts de `fake.errors` sont levés (HttpError),
+    un par appel, avant de servir le résultat.
+    """
+
+    def __init__(self, fake, method, kwargs, result):
+        self._fake = fake
+        self.method = HTTP_METHODS[method]
+        self.methodId = f"{type(fake).__name__}.{method}"
+        self.kwargs = kwargs
+        self._result = result
+        self.postproc = _postproc
+
+    def execute(self, num_retries=0):
+        self._fake.calls.append((self.methodId, self.kwargs))
+        if self._fake.errors:
+            status = self._fake.errors.pop(0)
+            raise HttpError(httplib2.Response({"status": str(status)}), b"", uri=self.methodId)
+        result = self._result(**self.kwargs) if callable(self._result) else self._result
+        content = result if isinstance(result, bytes) else json.dumps(result).encode()
+        return self.postproc(httplib2.Response({"status": "200"}), content)
+
+
+def _postproc(resp, content):
+    return json.loads(content) if content[:1] in (b"{", b"[") else content
+
+
+class _Resource:
+    def __init__(self, fake, methods):
+        self._fake = fake
+        self._methods = methods
+
+    def __getattr__(self, name):
+        if name not in self._methods:
+            raise AttributeError(name)
+        result = self._methods[name]
+        return lambda **kwargs: FakeRequest(self._fake, name, kwargs, result)
+
+
+class FakeCalendarService:
+    """Calendar v3 : calendarList().list() et events().list() paginé."""
+
+    def __init__(self, pages, calendars=None):
+        self.calls = []
+        self.errors = []  # statuts HTTP à lever aux prochains appels
+        self._pages = {None: pages[0]}
+        for page, nxt in zip(pages, pages[1:]):
+            self._pages[page["nextPageToken"]] = nxt
+        self._calendars = calendars or [{"id": "primary", "summary": "Agenda"}]
+
+    def calendarList(self):
+        return _Resource(self, {"list": lambda **kw: {"items": self._calendars}})
+
+    def events(self):
+        return _Resource(self, {"list": lambda pageToken=None, **kw: self._pages[pageToken]})
+
+
+class FakeDriveService:
+    """Drive v3 : copie de template, export PDF et upload."""
+
+    def __init__(self, pdf_size=50_000):
+        self.calls = []
+        self.errors = []  # statuts HTTP à lever aux prochains appels
+        self._ids = itertools.count(1)
+        self._pdf = b"%PDF-1.4\n" + b"0" * pdf_size
+
+    def files(self):
+        def _copy(**kw):
+            return {"id": f"doc{next(self._ids)}"}
+
+        def _create(**kw):
+            file_id = f"pdf{next(self._ids)}"
+            return {"id": file_id, "webViewLink": f"https://drive.example/{file_id}"}
+
+        return _Resource(self, {"copy": _copy, "export": self._pdf, "create": _create})
+
+
+class FakeDocsService:
+    """Docs v1 : batchUpdate (remplacement des balises)."""
+
+    def __init__(self):
+        self.calls = []
+        self.errors = []  # statuts HTTP à lever aux prochains appels
+
+    def documents(self):
+        return _Resource(self, {"batchUpdate": lambda **kw: {"replies": []}})
+
+
+class FakeSheetsService:
+    """Sheets v4 : spreadsheets().values().get()."""
+
+    def __init__(self, values):
+        self.calls = []
+        self.errors = []  # statuts HTTP à lever aux prochains appels
+        self._values = values
+
+    def spreadsheets(self):
+        fake = self
+
+        class _Spreadsheets:
+            def values(self):
+                return _Resource(fake, {"get": lambda **kw: {"values": [list(r) for r in fake._values]}})
+
+        return _Spreadsheets()
@@ -0,0 +1,208 @@
+"""
+Lance les benchmarks du pipeline PatternCal et compare à une baseline.
+
+    python -m benchmarks.run --sizes 1000 10000 --output report.json
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json    # CI
+
+Tailles par défaut : 1 000, 10 000, 100 000 et 1 000 000 d'événements
+(parse_ics et extraction_many_rules plafonnés à 100 000, voir --no-limit).
+Avec --baseline, le code de sortie vaut 1 si une mesure (temps ou pic mémoire)
+dépasse la baseline de plus de --tolerance (25 % par défaut) : utilisable en CI.
+La baseline commitée (benchmarks/baseline.json) est à régénérer avec
+--save-baseline sur la machine de CI quand le matériel change.
+"""
+import sys
+import json
+import time
+import argparse
+import datetime
+import platform
+import tracemalloc
+
+from utils import parse_ics, extraire_informations_agenda, filtrer_evenements_periode
+from oauth import get_events_from_calendar
+from sheets import get_sheet_data, enrichir_donnees
+from invoice import build_invoice_payloads, generate_invoice
+from aggregation import AggregationCube, MOIS_COL
+
+from benchmarks.synthetic import (
+    DEFAULT_RULES, generate_client_rules, generate_ics, generate_api_pages, generate_events, generate_sheet_values,
+)
+from benchmarks.fakes import (
+    FakeCalendarService, FakeDriveService, FakeDocsService, FakeSheetsService,
+)
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+MANY_RULES = generate_client_rules()
+PERIODE = (datetime.date(2024, 3, 1), datetime.date(2024, 9, 30))
+
+
+# --- Définition des benchmarks : setup(n) -> contexte, run(contexte) -> nb de lignes traitées ---
+
+def _setup_ics(n):
+    return generate_ics(n)
+
+
+def _run_ics(content):
+    return len(parse_ics(content))
+
+
+def _setup_calendar(n):
+    return generate_api_pages(n)
+
+
+def _run_calendar(pages):
+    service = FakeCalendarService(pages)
+    return len(get_events_from_calendar(service, "primary", time_min=datetime.datetime(2024, 1, 1)))
+
+
+def _setup_events(n):
+    return generate_events(n)
+
+
+def _run_extraction(events):
+    return len(extraire_informations_agenda(events, DEFAULT_RULES))
+
+
+def _run_extraction_many_rules(events):
+    return len(extraire_informations_agenda(events, MANY_RULES))
+
+
+def _run_date_filter(events):
+    return len(filtrer_evenements_periode(events, *PERIODE))
+
+
+def _setup_enrichment(n):
+    df_final = extraire_informations_agenda(generate_events(n), DEFAULT_RULES)
+    df_sheet = get_sheet_data(FakeSheetsService(generate_sheet_values()), "sheet")
+    return df_final, df_sheet
+
+
+def _run_enrichment(ctx):
+    df_final, df_sheet = ctx
+    return len(enrichir_donnees(df_final, df_sheet)[0])
+
+
+def _setup_invoices(n):
+    return extraire_informations_agenda(generate_events(n), DEFAULT_RULES)
+
+
+def _run_aggregation(df_final):
+    return len(AggregationCube.from_frame(df_final, ["Client", MOIS_COL, "Projet"]).cells)
+
+
+def _run_invoices(df_final):
+    drive, docs = FakeDriveService(), FakeDocsService()
+    payloads = build_invoice_payloads(df_final, "Client")
+    for _, data in payloads:
+        generate_invoice(drive, docs, "template", "folder", data)
+    return len(df_final)
+
+
+BENCHMARKS = {
+    # nom: (setup, run, taille max par défaut)
+    "parse_ics": (_setup_ics, _run_ics, 100_000),
+    "calendar_fetch": (_setup_calendar, _run_calendar, None),
+    "extraction": (_setup_events, _run_extraction, None),
+    "extraction_many_rules": (_setup_events, _run_extraction_many_rules, 100_000),
+    "date_filter": (_setup_events, _run_date_filter, None),
+    "enrichment": (_setup_enrichment, _run_enrichment, None),
+    "aggregation": (_setup_invoices, _run_aggregation, None),
+    "invoices": (_setup_invoices, _run_invoices, None),
+}
+
+
+def measure(setup, run, n, repeat):
+    """Meilleur temps sur `repeat` exécutions, puis pic mémoire sur une exécution tracée."""
+    ctx = setup(n)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = run(ctx)
+        timings.append(time.perf_counter() - start)
+
+    # Passe séparée : tracemalloc ralentit l'exécution et fausserait les temps
+    tracemalloc.start()
+    run(ctx)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    seconds = min(timings)
+    return {
+        "seconds": round(seconds, 6),
+        "events_per_s": round(n / seconds, 1) if seconds else None,
+        "rows": rows,
+        "peak_mb": round(peak / 1024 ** 2, 3),
+    }
+
+
+def run_suite(sizes, names=None, repeat=3, no_limit=False, log=print):
+    results = {}
+    for name, (setup, run, max_size) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        results[name] = {}
+        for n in sizes:
+            if max_size and n > max_size and not no_limit:
+                log(f"{name:<15} {n:>9} ignoré (> {max_size}, voir --no-limit)")
+                continue
+            res = measure(setup, run, n, repeat)
+            results[name][str(n)] = res
+            log(f"{name:<15} {n:>9} {res['seconds']:>10.4f} s "
+                f"{res['events_per_s'] or 0:>14,.0f} evt/s {res['peak_mb']:>9.2f} Mo")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Liste des régressions (temps ou mémoire) par rapport à la baseline."""
+    regressions = []
+    for name, by_size in report["results"].items():
+        for size, res in by_size.items():
+            ref = baseline.get("results", {}).get(name, {}).get(size)
+            if not ref:
+                continue
+            for metric in ("seconds", "peak_mb"):
+                if ref[metric] and res[metric] > ref[metric] * (1 + tolerance):
+                    regressions.append(
+                        f"{name}[{size}] {metric}: {res[metric]} > {ref[metric]} (+{tolerance:.0%})"
+                    )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="Benchmarks à lancer")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-limit", action="store_true", help="Ignore les tailles max par benchmark")
+    parser.add_argument("--output", help="Fichier JSON du rapport")
+    parser.add_argument("--baseline", help="Baseline JSON à laquelle comparer")
+    parser.add_argument("--save-baseline", help="Enregistre le rapport comme baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.sizes, args.only, args.repeat, args.no_limit)
+
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
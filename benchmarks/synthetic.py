@@ -0,0 +1,146 @@
+"""
+Générateur déterministe d'agendas synthétiques.
+
+Les titres suivent les règles par défaut de l'application (Client, Montant,
+Projet) avec des variantes réalistes : montant absent, séparateurs "," ou ".",
+"€" ou "EUR", projet optionnel, événements "journée entière", heures avec
+fuseau, en UTC ou flottantes.
+"""
+import random
+import datetime
+
+from utils import REGLES_PAR_DEFAUT as DEFAULT_RULES
+
+PRENOMS = ["Jean", "Marie", "Élodie", "Pierre", "Sophie", "Luc", "Camille", "André", "Chloé", "Hugo"]
+NOMS = ["Dupont", "Martin", "Bernard", "Lefèvre", "Moreau", "Garnier", "Roux", "Fournier", "Girard", "Bonnet"]
+ACTIVITES = ["séance", "rdv", "consultation", "atelier", "suivi", "bilan"]
+PROJETS = ["Alpha", "Beta", "Gamma", "Delta", "Omega"]
+
+START = datetime.datetime(2024, 1, 1, 8, 0)
+
+
+def generate_event_specs(n, seed=42, nb_clients=300):
+    """
+    Liste de n événements (dicts) : id, summary, start, end (datetime naive),
+    all_day (bool) et kind ("tz", "utc" ou "floating").
+    """
+    rng = random.Random(seed)
+    clients = [f"{rng.choice(PRENOMS)} {rng.choice(NOMS)}" for _ in range(nb_clients)]
+
+    specs = []
+    for i in range(n):
+        parts = [rng.choice(ACTIVITES), clients[rng.randrange(nb_clients)]]
+        if rng.random() < 0.85:
+            amount = rng.randint(30, 400)
+            cents = f"{rng.choice(',.')}{rng.randint(0, 99):02d}" if rng.random() < 0.3 else ""
+            parts.append(f"{amount}{cents}{rng.choice(['€', ' €', ' EUR'])}")
+        if rng.random() < 0.5:
+            parts.append(f"Projet : {rng.choice(PROJETS)}")
+        summary = " - ".join(parts)
+
+        day = START + datetime.timedelta(days=(i * 365) // max(n, 1))
+        if rng.random() < 0.05:
+            start = day.replace(hour=0, minute=0)
+            end = start + datetime.timedelta(days=1)
+            specs.append({"id": f"evt{i}", "summary": summary, "start": start,
+                          "end": end, "all_day": True, "kind": "floating"})
+            continue
+
+        start = day.replace(hour=rng.randint(8, 18), minute=rng.choice([0, 15, 30, 45]))
+        end = start + datetime.timedelta(minutes=rng.choice([30, 45, 60, 90, 120]))
+        kind = rng.choices(["tz", "utc", "floating"], weights=[8, 1, 1])[0]
+        specs.append({"id": f"evt{i}", "summary": summary, "start": start,
+                      "end": end, "all_day": False, "kind": kind})
+    return specs
+
+
+def _ics_dt(prop, dt, all_day, kind):
+    if all_day:
+        return f"{prop};VALUE=DATE:{dt:%Y%m%d}"
+    if kind == "tz":
+        return f"{prop};TZID=Europe/Paris:{dt:%Y%m%dT%H%M%S}"
+    if kind == "utc":
+        return f"{prop}:{dt:%Y%m%dT%H%M%S}Z"
+    return f"{prop}:{dt:%Y%m%dT%H%M%S}"
+
+
+def generate_ics(n, seed=42):
+    """Contenu d'un fichier .ics de n événements (bytes)."""
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//PatternCal//Benchmarks//FR"]
+    for spec in generate_event_specs(n, seed):
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{spec['id']}@patterncal",
+            "DTSTAMP:20240101T000000Z",
+            _ics_dt("DTSTART", spec["start"], spec["all_day"], spec["kind"]),
+            _ics_dt("DTEND", spec["end"], spec["all_day"], spec["kind"]),
+            f"SUMMARY:{spec['summary']}",
+            "END:VEVENT",
+        ]
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(lines) + "\r\n").encode("utf-8")
+
+
+def _api_dt(dt, all_day, kind):
+    if all_day:
+        return {"date": dt.date().isoformat()}
+    if kind == "utc":
+        return {"dateTime": dt.isoformat() + "Z"}
+    # L'API renvoie toujours un offset explicite ; on simule Paris en heure d'hiver
+    return {"dateTime": dt.isoformat() + "+01:00", "timeZone": "Europe/Paris"}
+
+
+def generate_api_pages(n, seed=42, page_size=2500):
+    """Réponses paginées de events().list de l'API Calendar pour n événements."""
+    items = [
+        {
+            "id": spec["id"],
+            "summary": spec["summary"],
+            "start": _api_dt(spec["start"], spec["all_day"], spec["kind"]),
+            "end": _api_dt(spec["end"], spec["all_day"], spec["kind"]),
+        }
+        for spec in generate_event_specs(n, seed)
+    ]
+    pages = []
+    for i in range(0, max(len(items), 1), page_size):
+        page = {"kind": "calendar#events", "items": items[i:i + page_size]}
+        if i + page_size < len(items):
+            page["nextPageToken"] = f"page{i // page_size + 1}"
+        pages.append(page)
+    return pages
+
+
+def generate_events(n, seed=42):
+    """Événements au format interne (sortie de parse_ics / get_events_from_calendar)."""
+    from zoneinfo import ZoneInfo
+    tz = {"tz": ZoneInfo("Europe/Paris"), "utc": datetime.timezone.utc, "floating": None}
+
+    events = []
+    for spec in generate_event_specs(n, seed):
+        if spec["all_day"]:
+            start, end = spec["start"].date(), spec["end"].date()
+        else:
+            start = spec["start"].replace(tzinfo=tz[spec["kind"]])
+            end = spec["end"].replace(tzinfo=tz[spec["kind"]])
+        events.append({"id": spec["id"], "summary": spec["summary"], "dtstart": start,
+                       "dtend": end})
+    return events
+
+
+def generate_sheet_values(seed=42, nb_clients=300):
+    """Valeurs d'une Google Sheet d'enrichissement (header + une ligne par client)."""
+    rng = random.Random(seed)
+    clients = sorted({f"{rng.choice(PRENOMS)} {rng.choice(NOMS)}" for _ in range(nb_clients)})
+    values = [["Client", "Email", "Adresse"]]
+    for i, client in enumerate(clients):
+        values.append([client, f"client{i}@example.com", f"{i} rue de la Paix, Paris"])
+    return values
+
+
+def generate_client_rules(seed=42, nb_clients=300):
+    """Jeu de règles volumineux : une règle par client, comme certaines équipes les configurent."""
+    rng = random.Random(seed)
+    clients = sorted({f"{rng.choice(PRENOMS)} {rng.choice(NOMS)}" for _ in range(nb_clients)})
+    rules = [{"name": f"Client {i}", "pattern": rf"({client})\s*-\s*(\d+)", "type": "text"}
+             for i, client in enumerate(clients)]
+    return DEFAULT_RULES + rules
@@ -0,0 +1,178 @@
+import re
+import datetime
+import itertools
+import numpy as np
+
+try:
+    from re import _parser as sre_parse  # Python >= 3.11
+except ImportError:
+    import sre_parse
+
+from oauth import get_events_from_calendar
+from shared_cache import estimate_size
+from datetimes import DEFAULT_TZ, to_epoch_ns, to_local
+
+# Marge appliquée autour de chaque tranche pour ne pas rater les événements
+# proches de minuit dans un autre fuseau que UTC
+FUSEAU_MARGE = datetime.timedelta(days=1)
+
+_GENERATIONS = itertools.count()
+
+
+def literal_prefix(pattern):
+    """
+    Retourne le préfixe littéral d'une regex (ex: r"Projet\\s*:\\s*(\\w+)" -> "Projet").
+    Chaîne vide si la regex ne commence pas par un littéral ou est invalide.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return ""
+
+    def _walk(items):
+        chars = []
+        for op, av in items:
+            if op is sre_parse.LITERAL:
+                chars.append(chr(av))
+            elif op is sre_parse.SUBPATTERN:
+                # Groupe en tête de motif : on descend dedans
+                inner, complete = _walk(av[-1])
+                chars.append(inner)
+                if not complete:
+                    return "".join(chars), False
+            else:
+                return "".join(chars), False
+        return "".join(chars), True
+
+    prefix, _ = _walk(parsed)
+    return prefix
+
+
+def derive_query_prefilter(regex_configs, min_length=3):
+    """
+    Termes de recherche pour le paramètre `q` de l'API Calendar, par règle.
+
+    Pour chaque règle, on prend le mot le plus long de son préfixe littéral :
+    seuls les événements contenant ce mot peuvent satisfaire cette règle. Le
+    filtre ne vaut donc que pour les événements d'une seule règle ; tout le
+    reste (autres règles, KPI, synthèses) ne porte plus que sur ce sous-ensemble.
+    Retourne {nom de règle: terme}, sans les règles sans préfixe exploitable.
+    """
+    terms = {}
+    for config in regex_configs:
+        if not config.get("pattern"):
+            continue
+        best = None
+        for word in re.findall(r"\w+", literal_prefix(config["pattern"])):
+            if len(word) >= min_length and (best is None or len(word) > len(best)):
+                best = word
+        if best:
+            terms[config["name"]] = best
+    return terms
+
+
+class FetchedRangeCache:
+    """
+    Mémorise, par (agenda, filtre q), les plages de jours déjà récupérées et
+    les événements correspondants. Élargir la période ne déclenche la
+    récupération que des tranches manquantes.
+    """
+
+    def __init__(self):
+        self._ranges = {}  # clé -> liste triée de (début, fin) en dates, fin exclue
+        self._events = {}  # clé -> {id événement: événement}
+        # Version du contenu, unique dans le processus (clé des résultats dérivés)
+        self.generation = next(_GENERATIONS)
+
+    @staticmethod
+    def key(calendar_id, q=None):
+        return (calendar_id, q or "")
+
+    def missing(self, key, start, end):
+        """Liste des tranches [début, fin) non encore couvertes."""
+        slices = []
+        cursor = start
+        for r_start, r_end in self._ranges.get(key, []):
+            if r_end <= cursor:
+                continue
+            if r_start >= end:
+                break
+            if r_start > cursor:
+                slices.append((cursor, r_start))
+            cursor = max(cursor, r_end)
+        if cursor < end:
+            slices.append((cursor, end))
+        return slices
+
+    def add(self, key, start, end, events):
+        """Enregistre les événements d'une tranche et fusionne les plages couvertes."""
+        store = self._events.setdefault(key, {})
+        for evt in events:
+            evt_id = evt.get("id") or (evt["summary"], str(evt["dtstart"]))
+            store[evt_id] = evt
+
+        ranges = sorted(self._ranges.get(key, []) + [(start, end)])
+        merged = [ranges[0]]
+        for r_start, r_end in ranges[1:]:
+            if r_start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], r_end))
+            else:
+                merged.append((r_start, r_end))
+        self._ranges[key] = merged
+        self.generation = next(_GENERATIONS)
+
+    def events(self, key, start, end, tz=DEFAULT_TZ):
+        """Événements en cache dont la date de début (dans `tz`) est dans [début, fin), par ordre chronologique."""
+        store = list(self._events.get(key, {}).values())
+        if not store:
+            return []
+        start_ns, _ = to_epoch_ns([evt["dtstart"] for evt in store], tz)
+        days = to_local(start_ns, tz).to_numpy("datetime64[D]")
+        selected = np.flatnonzero((days >= np.datetime64(start, "D")) & (days < np.datetime64(end, "D")))
+        selected = selected[np.argsort(start_ns[selected], kind="stable")]
+        return [store[i] for i in selected]
+
+    @property
+    def nbytes(self):
+        """Taille approximative des événements en cache (octets)."""
+        return sum(estimate_size(list(store.values())) for store in self._events.values())
+
+    def clear(self, key=None):
+        if key is None:
+            self._ranges.clear()
+            self._events.clear()
+        else:
+            self._ranges.pop(key, None)
+            self._events.pop(key, None)
+        self.generation = next(_GENERATIONS)
+
+
+def fetch_period(service, calendar_id, date_debut, date_fin, cache, q=None, tz=DEFAULT_TZ,
+                 archive=None, archive_scope=None):
+    """
+    Retourne les événements de la période [date_debut, date_fin] (bornes incluses),
+    en ne requêtant l'API que pour les tranches absentes du cache.
+    Avec une archive (archive.EventArchive), les tranches manquantes sont lues
+    sur disque pour les mois clos ; seuls les mois ouverts sont requêtés.
+    Retourne (événements, nombre de tranches récupérées).
+    """
+    end = date_fin + datetime.timedelta(days=1)
+    key = cache.key(calendar_id, q)
+    slices = cache.missing(key, date_debut, end)
+
+    def _fetch(time_min, time_max):
+        return get_events_from_calendar(
+            service, calendar_id, time_min=time_min, time_max=time_max, q=q
+        )
+
+    for s_start, s_end in slices:
+        if archive is not None and not q:
+            # L'archive ne contient que des agendas complets : pas de pré-filtre q
+            events = archive.events(archive_scope, s_start, s_end, _fetch, tz)
+        else:
+            time_min = datetime.datetime.combine(s_start, datetime.time.min) - FUSEAU_MARGE
+            time_max = datetime.datetime.combine(s_end, datetime.time.min) + FUSEAU_MARGE
+            events = _fetch(time_min, time_max)
+        cache.add(key, s_start, s_end, events)
+
+    return cache.events(key, date_debut, end, tz), len(slices)
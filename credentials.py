@@ -0,0 +1,187 @@
+import os
+import time
+import shutil
+import hashlib
+import secrets
+import datetime
+import threading
+from google.auth.transport.requests import Request
+import streamlit as st
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Ancien cache de tokens sur disque : purgé au démarrage, plus jamais écrit
+CACHE_DIR = ".patterncal"
+LEGACY_TOKEN_DIR = os.path.join(CACHE_DIR, "tokens")
+LEGACY_KEY_FILE = os.path.join(CACHE_DIR, "token.key")
+
+# On rafraîchit le token d'accès quand il lui reste moins de REFRESH_MARGIN
+REFRESH_MARGIN = datetime.timedelta(minutes=5)
+CHECK_INTERVAL = 60  # secondes entre deux passages du thread de refresh
+# Credentials d'une session inutilisés depuis SESSION_TTL : oubliés (plus de refresh)
+SESSION_TTL = datetime.timedelta(hours=2)
+# Verrous de session répartis sur un pool fixe : jamais créés ni supprimés à la volée
+LOCK_STRIPES = 64
+
+
+def _purge_legacy_cache(token_dir=LEGACY_TOKEN_DIR, key_file=LEGACY_KEY_FILE):
+    """Supprime les refresh tokens chiffrés écrits par les versions précédentes."""
+    shutil.rmtree(token_dir, ignore_errors=True)
+    if os.path.exists(key_file):
+        os.remove(key_file)
+
+
+def current_session_owner():
+    """Identifiant de la session Streamlit en cours (None hors exécution de script)."""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+
+def _session_alive(owner):
+    # Hors serveur Streamlit (headless, tests), seule l'inactivité fait expirer une session
+    return not runtime.exists() or runtime.get_instance().is_active_session(owner)
+
+
+class CredentialManager:
+    """
+    Gestionnaire de credentials partagé par toutes les sessions Streamlit.
+
+    - Un thread d'arrière-plan rafraîchit les tokens avant leur expiration,
+      les appels API n'ont donc jamais à payer la latence du refresh.
+    - Un verrou par session sérialise les refresh concurrents (thread de
+      fond, refresh en ligne de oauth.get_calendar_service).
+    - Les credentials ne vivent qu'en mémoire, indexés par le hash d'un
+      identifiant de session opaque conservé dans l'état de session (jamais
+      dans l'URL, jamais sur disque). Ils sont oubliés à la fin de la session
+      Streamlit qui les a enregistrés, ou après `session_ttl` sans usage.
+    """
+
+    def __init__(self, refresh_margin=REFRESH_MARGIN, check_interval=CHECK_INTERVAL,
+                 session_ttl=SESSION_TTL, is_alive=_session_alive):
+        self.refresh_margin = refresh_margin
+        self.check_interval = check_interval
+        self.session_ttl = session_ttl.total_seconds()
+        self.is_alive = is_alive
+        self._creds = {}
+        self._used = {}    # slot -> dernier accès (time.monotonic)
+        self._owners = {}  # slot -> session Streamlit propriétaire
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._registry_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def new_session_id():
+        """Génère un identifiant de session opaque (conservé dans l'état de session, jamais dans l'URL)."""
+        return secrets.token_urlsafe(24)
+
+    @staticmethod
+    def _slot(session_id):
+        # On ne stocke jamais l'identifiant en clair, seulement son hash
+        return hashlib.sha256(session_id.encode()).hexdigest()
+
+    def _lock_for(self, slot):
+        return self._locks[int(slot[:8], 16) % len(self._locks)]
+
+    # --- API publique ---
+
+    def register(self, session_id, creds, owner=None):
+        """Enregistre des credentials fraîchement obtenus pour la session Streamlit `owner`."""
+        slot = self._slot(session_id)
+        with self._lock_for(slot):
+            self._creds[slot] = creds
+            self._used[slot] = time.monotonic()
+            self._owners[slot] = owner
+        self._ensure_thread()
+
+    def get(self, session_id):
+        """
+        Retourne les credentials associés à la session (rafraîchis si besoin,
+        sous le verrou de la session), ou None si inconnus, expirés ou révoqués.
+        """
+        slot = self._slot(session_id)
+        creds = self._creds.get(slot)
+        if creds is None:
+            return None
+        self._used[slot] = time.monotonic()
+        if not creds.valid:
+            try:
+                self._refresh(slot, margin=datetime.timedelta(0))
+            except Exception:
+                self.forget(session_id)
+                return None
+        return creds
+
+    def lock(self, session_id):
+        """Verrou de la session, à tenir pour tout refresh hors du gestionnaire."""
+        return self._lock_for(self._slot(session_id))
+
+    def forget(self, session_id):
+        """Oublie les credentials de la session (déconnexion)."""
+        self._drop(self._slot(session_id))
+
+    def _drop(self, slot):
+        with self._lock_for(slot):
+            self._creds.pop(slot, None)
+            self._used.pop(slot, None)
+            self._owners.pop(slot, None)
+
+    def evict_stale(self):
+        """Oublie les credentials des sessions terminées ou inutilisées depuis `session_ttl`."""
+        now = time.monotonic()
+        for slot in list(self._creds):
+            owner = self._owners.get(slot)
+            idle = now - self._used.get(slot, now) > self.session_ttl
+            if idle or (owner is not None and not self.is_alive(owner)):
+                self._drop(slot)
+
+    # --- Refresh anticipé ---
+
+    def _needs_refresh(self, creds, margin):
+        if not creds.refresh_token:
+            return False
+        if not creds.token or not creds.expiry:
+            return True
+        # google-auth manipule des expiry en UTC naive
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return creds.expiry - now <= margin
+
+    def _refresh(self, slot, margin):
+        with self._lock_for(slot):
+            creds = self._creds.get(slot)
+            # Re-vérification sous verrou : un autre thread a pu rafraîchir entre temps
+            if creds is None or not self._needs_refresh(creds, margin):
+                return
+            creds.refresh(Request())
+
+    def refresh_due(self):
+        """Oublie les sessions terminées, puis rafraîchit les credentials proches de l'expiration."""
+        self.evict_stale()
+        for slot in list(self._creds.keys()):
+            try:
+                self._refresh(slot, self.refresh_margin)
+            except Exception:
+                # Token révoqué : l'utilisateur devra se reconnecter
+                self._drop(slot)
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            self.refresh_due()
+
+    def _ensure_thread(self):
+        with self._registry_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="patterncal-token-refresh", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+@st.cache_resource
+def get_credential_manager():
+    """Instance unique du gestionnaire, partagée entre toutes les sessions."""
+    _purge_legacy_cache()
+    return CredentialManager()
@@ -0,0 +1,114 @@
+import os
+import datetime
+from operator import attrgetter
+import numpy as np
+import pandas as pd
+
+# Fuseau de restitution : dates affichées, filtres de période, regroupements par mois
+DEFAULT_TZ = os.environ.get("PATTERNCAL_TZ", "Europe/Paris")
+# Fuseaux proposés dans l'app (DEFAULT_TZ y est ajouté s'il n'y figure pas)
+TIMEZONES = [
+    "Europe/Paris", "Europe/Brussels", "Europe/Zurich", "Europe/London", "Europe/Madrid",
+    "Africa/Casablanca", "America/Montreal", "America/New_York", "America/Mexico_City", "UTC",
+]
+if DEFAULT_TZ not in TIMEZONES:
+    TIMEZONES.insert(0, DEFAULT_TZ)
+
+NAT = np.iinfo(np.int64).min
+_NS_PER_S = 1_000_000_000
+
+# Offset explicite en fin de chaîne ISO 8601 ("Z", "+01:00", "-0500")
+_ISO_OFFSET = r"(?:Z|[+-]\d\d:?\d\d)$"
+
+
+def _to_utc_ns(utc: pd.Series) -> np.ndarray:
+    return utc.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy("datetime64[ns]").view(np.int64)
+
+
+def _localize_ns(wall: pd.Series, tz) -> np.ndarray:
+    # Heure murale dans `tz` -> instant UTC. Heure ambiguë (passage à l'heure d'hiver) :
+    # première occurrence ; heure inexistante (passage à l'heure d'été) : décalée après le saut.
+    wall = pd.to_datetime(wall, errors="coerce", format="mixed", cache=False)
+    localized = wall.dt.tz_localize(tz, ambiguous=np.ones(len(wall), dtype=bool), nonexistent="shift_forward")
+    return _to_utc_ns(localized)
+
+
+def to_epoch_ns(values, tz=DEFAULT_TZ):
+    """
+    Convertit un lot de dates / datetimes (objets Python ou chaînes ISO 8601
+    de l'API Google) en instants UTC : int64, nanosecondes depuis l'epoch.
+
+    - datetime avec fuseau, chaîne avec offset : instant exact ;
+    - datetime sans fuseau ("flottant"), date pure (journée entière),
+      chaîne sans offset : heure murale interprétée dans `tz`.
+
+    Retourne (epoch_ns, all_day). Valeurs illisibles : NAT.
+    """
+    s = pd.Series(values, dtype=object)
+    epoch_ns = np.full(len(s), NAT, dtype=np.int64)
+    all_day = np.zeros(len(s), dtype=bool)
+    if s.empty:
+        return epoch_ns, all_day
+
+    kinds = s.map(type)
+    # date pure : la classe exacte (datetime hérite de date)
+    is_date = (kinds == datetime.date).to_numpy()
+    is_str = (kinds == str).to_numpy()
+    is_datetime = ~(is_date | is_str) & s.notna().to_numpy()
+
+    aware = np.zeros(len(s), dtype=bool)
+    if is_datetime.any():
+        aware[is_datetime] = s[is_datetime].map(attrgetter("tzinfo")).notna().to_numpy()
+    if is_str.any():
+        strings = s[is_str].astype(str)
+        # "2024-01-01" : journée entière (format "date" de l'API Google)
+        all_day[is_str] = (strings.str.len() == 10).to_numpy()
+        aware[is_str] = strings.str.contains(_ISO_OFFSET, regex=True).to_numpy()
+    all_day |= is_date
+
+    if aware.any():
+        epoch_ns[aware] = _to_utc_ns(pd.to_datetime(s[aware], utc=True, errors="coerce", format="mixed", cache=False))
+    floating = ~aware & s.notna().to_numpy()
+    if floating.any():
+        epoch_ns[floating] = _localize_ns(s[floating], tz)
+    return epoch_ns, all_day
+
+
+def to_local(epoch_ns: np.ndarray, tz=DEFAULT_TZ) -> pd.Series:
+    """Instants UTC (int64 ns) -> heure murale sans fuseau dans `tz` (datetime64[ns])."""
+    utc = pd.Series(epoch_ns.view("datetime64[ns]")).dt.tz_localize("UTC")
+    return utc.dt.tz_convert(tz).dt.tz_localize(None)
+
+
+def normalize_events(events: list[dict], tz=DEFAULT_TZ) -> pd.DataFrame:
+    """
+    Étape unique de normalisation temporelle d'un lot d'événements.
+
+    Colonnes : start_ns / end_ns (instants UTC int64), all_day, date (début
+    en heure murale de `tz`) et duration_s. La durée d'un événement
+    "journée entière" se compte en jours calendaires (24 h même lors d'un
+    changement d'heure) ; sans fin, l'événement dure 0.
+    """
+    start_ns, all_day = to_epoch_ns([e["dtstart"] for e in events], tz)
+    end_ns, _ = to_epoch_ns([e.get("dtend") or e["dtstart"] for e in events], tz)
+    local_start = to_local(start_ns, tz)
+    local_end = to_local(end_ns, tz)
+
+    wall_s = (local_end - local_start).dt.total_seconds().to_numpy()
+    epoch_s = (end_ns - start_ns) / _NS_PER_S
+    duration_s = np.where(all_day, wall_s, epoch_s)
+    duration_s[(start_ns == NAT) | (end_ns == NAT)] = 0.0
+
+    return pd.DataFrame({
+        "start_ns": start_ns,
+        "end_ns": end_ns,
+        "all_day": all_day,
+        "date": local_start,
+        "duration_s": duration_s,
+    })
+
+
+def local_dates(events: list[dict], tz=DEFAULT_TZ) -> np.ndarray:
+    """Jour de début de chaque événement dans `tz` (datetime64[D])."""
+    start_ns, _ = to_epoch_ns([e["dtstart"] for e in events], tz)
+    return to_local(start_ns, tz).to_numpy("datetime64[D]")
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+# Une colonne texte devient catégorielle si ses valeurs distinctes ne dépassent pas cette part des lignes
+CATEGORY_RATIO = 0.5
+# Autres colonnes texte : chaînes Arrow (dtype "str" de pandas, stocké par pyarrow)
+TEXT_DTYPE = "str"
+
+
+def memory_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True).sum())
+
+
+def _is_text(s: pd.Series) -> bool:
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return False
+    if pd.api.types.is_string_dtype(s.dtype) and not pd.api.types.is_object_dtype(s.dtype):
+        return True
+    return pd.api.types.is_object_dtype(s.dtype) and pd.api.types.infer_dtype(s, skipna=True) in ("string", "empty")
+
+
+def _compact_text(s: pd.Series, categorical=False) -> pd.Series:
+    if categorical or (len(s) and s.nunique(dropna=True) <= CATEGORY_RATIO * len(s)):
+        # Catégories triées : tri et filtres donnent le même ordre que sur les chaînes
+        return s.astype(pd.CategoricalDtype(sorted(s.dropna().unique())))
+    return s.astype(TEXT_DTYPE)
+
+
+def _compact_float(s: pd.Series) -> pd.Series:
+    # float32 seulement si chaque valeur y est représentée exactement (0.25 h, 1.5 h, 500 €...)
+    values = s.to_numpy()
+    if np.array_equal(values.astype(np.float32).astype(np.float64), values, equal_nan=True):
+        return s.astype(np.float32)
+    return s
+
+
+def compact_dtypes(df: pd.DataFrame, categorical=()) -> pd.DataFrame:
+    """
+    Applique le plan de types compact à un résultat (extraction, Sheet) :
+
+    - texte répétitif (clients, projets...) -> catégorie ;
+    - autre texte -> chaînes Arrow ;
+    - float64 -> float32 lorsque c'est sans perte.
+
+    `categorical` : colonnes toujours converties en catégorie (clés de
+    jointure). Les sommes doivent être calculées en float64. La mémoire avant
+    / après (octets) est reportée dans `df.attrs["memoire"]`.
+    """
+    avant = memory_bytes(df)
+    out = df.copy(deep=False)
+    for i, col in enumerate(df.columns):
+        s = df.iloc[:, i]
+        if _is_text(s):
+            out.isetitem(i, _compact_text(s, categorical=col in categorical))
+        elif s.dtype == np.float64:
+            out.isetitem(i, _compact_float(s))
+    out.attrs["memoire"] = {"avant": avant, "apres": memory_bytes(out)}
+    return out
@@ -0,0 +1,97 @@
+import io
+import tempfile
+import pandas as pd
+from openpyxl import Workbook
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# Nombre de lignes converties à la fois : borne la mémoire de travail
+CHUNK_ROWS = 20_000
+# Au-delà, le fichier temporaire bascule de la RAM vers le disque
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+EXPORT_FORMATS = {
+    "csv": {"extension": "csv", "mime": "text/csv"},
+    "xlsx": {
+        "extension": "xlsx",
+        "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    },
+}
+if PARQUET_AVAILABLE:
+    EXPORT_FORMATS["parquet"] = {"extension": "parquet", "mime": "application/vnd.apache.parquet"}
+
+
+def iter_chunks(df: pd.DataFrame, chunk_rows: int = CHUNK_ROWS):
+    """Découpe un DataFrame en tranches de chunk_rows lignes (vues, sans copie)."""
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+    if df.empty:
+        yield df
+
+
+def _write_csv(df, out, chunk_rows):
+    # BOM UTF-8 pour qu'Excel reconnaisse les accents
+    text = io.TextIOWrapper(out, encoding="utf-8-sig", newline="")
+    for i, chunk in enumerate(iter_chunks(df, chunk_rows)):
+        chunk.to_csv(text, index=False, header=(i == 0))
+    text.flush()
+    text.detach()  # on rend la main sur le flux binaire sans le fermer
+
+
+def _write_xlsx(df, out, chunk_rows, sheet_name):
+    # Mode write-only : openpyxl écrit les lignes au fil de l'eau sans garder la feuille en mémoire
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_name[:31])
+    ws.append([str(c) for c in df.columns])
+    for chunk in iter_chunks(df, chunk_rows):
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            ws.append(row)
+    wb.save(out)
+
+
+def _write_parquet(df, out, chunk_rows):
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(out, schema) as writer:
+        # Une tranche = un row group
+        for chunk in iter_chunks(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def export_frame(df: pd.DataFrame, fmt: str, sheet_name: str = "Export",
+                 chunk_rows: int = CHUNK_ROWS):
+    """
+    Exporte un DataFrame par tranches vers un fichier temporaire "spooled"
+    (en RAM jusqu'à SPOOL_MAX_SIZE, sur disque au-delà), rembobiné et prêt à lire.
+    La mémoire de travail reste bornée quel que soit le nombre de lignes.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Format d'export non supporté : {fmt}")
+
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    if fmt == "csv":
+        _write_csv(df, out, chunk_rows)
+    elif fmt == "xlsx":
+        _write_xlsx(df, out, chunk_rows, sheet_name)
+    else:
+        _write_parquet(df, out, chunk_rows)
+    out.seek(0)
+    return out
+
+
+def export_reader(df: pd.DataFrame, fmt: str, sheet_name: str = "Export") -> io.BufferedReader:
+    """
+    export_frame() présenté comme un lecteur binaire (io.BufferedReader), forme
+    de fichier acceptée par st.download_button : le fichier est transmis tel
+    quel, sans copie intermédiaire en bytes.
+    """
+    return io.BufferedReader(export_frame(df, fmt, sheet_name=sheet_name))
+
+
+def export_filename(base: str, fmt: str) -> str:
+    return f"{base}.{EXPORT_FORMATS[fmt]['extension']}"
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+# Tailles de page proposées par la grille de résultats
+PAGE_SIZES = [50, 100, 500]
+
+
+class ResultGrid:
+    """
+    Vue paginée d'un DataFrame conservé côté serveur.
+
+    Filtrage et tri sont calculés sur les colonnes (opérations vectorisées)
+    et produisent un tableau de positions ; seule la page affichée est
+    extraite et envoyée au navigateur. Le résultat de la dernière requête est
+    mémorisé : changer de page ne recalcule ni filtre ni tri.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df.reset_index(drop=True)
+        self._haystack = None
+        self._last_query = None
+        self._positions = np.arange(len(self.df))
+
+    @property
+    def columns(self):
+        return list(self.df.columns)
+
+    def _search_column(self):
+        # Texte de recherche (colonnes texte concaténées, en minuscules), construit à la première recherche
+        if self._haystack is None:
+            text_cols = [c for c in self.df.columns if not pd.api.types.is_numeric_dtype(self.df[c])
+                         and not pd.api.types.is_datetime64_any_dtype(self.df[c])]
+            if text_cols:
+                parts = [self.df[c].astype("string").fillna("") for c in text_cols]
+                self._haystack = parts[0].str.cat(parts[1:], sep="\x1f").str.lower()
+            else:
+                self._haystack = pd.Series("", index=self.df.index, dtype="string")
+        return self._haystack
+
+    def mask(self, search: str = "", filters: dict = None) -> np.ndarray:
+        """Masque booléen des lignes retenues par la recherche et les filtres {colonne: valeur}."""
+        mask = np.ones(len(self.df), dtype=bool)
+        for column, value in (filters or {}).items():
+            mask &= (self.df[column] == value).to_numpy()
+        if search:
+            found = self._search_column().str.contains(search.lower(), regex=False)
+            mask &= found.fillna(False).to_numpy(dtype=bool)
+        return mask
+
+    def query(self, search: str = "", filters: dict = None, sort_by: str = None, ascending: bool = True) -> np.ndarray:
+        """Positions (dans self.df) des lignes filtrées, dans l'ordre de tri demandé."""
+        key = (search, tuple(sorted((filters or {}).items(), key=str)), sort_by, ascending)
+        if key == self._last_query:
+            return self._positions
+
+        positions = np.flatnonzero(self.mask(search, filters)) if (search or filters) else np.arange(len(self.df))
+        if sort_by:
+            # Tri stable, valeurs manquantes en fin ; l'index reste la position d'origine
+            ordered = self.df[sort_by].take(positions).sort_values(
+                ascending=ascending, kind="stable", na_position="last"
+            )
+            positions = ordered.index.to_numpy()
+
+        self._last_query = key
+        self._positions = positions
+        return positions
+
+    def page(self, positions: np.ndarray, number: int, size: int) -> pd.DataFrame:
+        """Page `number` (à partir de 1) de `size` lignes."""
+        start = (number - 1) * size
+        return self.df.take(positions[start:start + size])
+
+
+def page_count(nb_rows: int, size: int) -> int:
+    return max(1, -(-nb_rows // size))
@@ -0,0 +1,243 @@
+"""
+Exécution du pipeline PatternCal sans interface (cron, CI, facturation en lot).
+
+    python headless.py --ics agenda.ics --start 2024-01-01 --end 2024-01-31 \\
+        --output resultats.csv --metrics metrics.prom
+
+    python headless.py --ics-url "https://calendar.google.com/calendar/ical/.../basic.ics" \\
+        --start 2024-01-01 --end 2024-01-31 --output resultats.csv
+
+    python headless.py --calendar-id primary --token token.json \\
+        --start 2024-01-01 --end 2024-01-31 --sheet URL --template URL --folder URL \\
+        --metrics metrics.prom
+
+    python headless.py --calendar-id primary --replay cassettes/janvier.json \
+        --latency 0.08 --error-rate 0.05 --retries 3 --start 2024-01-01 --end 2024-01-31 ...
+
+--token est un fichier "authorized user" (google.oauth2.credentials).
+--record enregistre les échanges HTTP avec Google dans une cassette, --replay
+les rejoue hors ligne (voir replay.py).
+--archive (avec --calendar-id) relit les mois clos dans l'archive locale au lieu
+de les récupérer à nouveau (voir archive.py).
+--retries rejoue les appels Google refusés (429 / 5xx), aucun rejeu par défaut.
+--metrics écrit les mesures d'étapes et d'appels API au format Prometheus / OpenMetrics.
+"""
+import sys
+import json
+import argparse
+import datetime
+
+from utils import (
+    REGLES_PAR_DEFAUT, parse_ics, extraire_informations_agenda, filtrer_evenements_periode,
+)
+from datetimes import DEFAULT_TZ
+from instrumentation import Instrumentation, use as use_instrumentation, use_retries, stage
+
+
+def find_client_column(df, regex_configs):
+    """Colonne de regroupement des factures (même logique que l'app)."""
+    candidates = [c for c in df.columns if "client" in c.lower()]
+    if candidates:
+        return candidates[0]
+    if "Client" in [c["name"] for c in regex_configs] and "Client" in df.columns:
+        return "Client"
+    return None
+
+
+def load_events(args, creds, http=None):
+    if args.ics:
+        with stage("ics_read") as rec:
+            with open(args.ics, "rb") as f:
+                content = f.read()
+            rec["bytes"] = len(content)
+        with stage("ics_parse") as rec:
+            events = parse_ics(content)
+            rec["rows"] = len(events)
+        return events
+
+    if args.ics_url:
+        from ical_feed import ICalFeeds
+        from shared_cache import SharedCache
+        feeds = ICalFeeds(SharedCache())
+        try:
+            with stage("ics_fetch") as rec:
+                events, _ = feeds.get(args.ics_url)
+                rec["rows"] = len(events)
+        finally:
+            feeds.stop()
+        return events
+
+    from oauth import get_calendar_service, get_events_from_calendar
+    service = get_calendar_service(creds, http=http)
+    if args.archive:
+        return load_archived_events(args, service)
+    with stage("calendar_fetch") as rec:
+        events = get_events_from_calendar(
+            service, args.calendar_id,
+            time_min=datetime.datetime.combine(args.start, datetime.time.min) - datetime.timedelta(days=1),
+            time_max=datetime.datetime.combine(args.end, datetime.time.min) + datetime.timedelta(days=2),
+        )
+        rec["rows"] = len(events)
+    return events
+
+
+def load_archived_events(args, service):
+    """Période lue dans l'archive locale : seuls les mois non clos sont requêtés."""
+    from oauth import list_calendars, get_events_from_calendar
+    from shared_cache import calendar_scope
+    from archive import EventArchive
+    # Même portée que dans l'app : l'archive dépend du niveau d'accès à l'agenda
+    # "primary" est un alias de l'API : l'archive est rangée sous l'identifiant réel de l'agenda principal
+    calendar = next((
+        c for c in list_calendars(service)
+        if c["id"] == args.calendar_id or (args.calendar_id == "primary" and c.get("primary"))
+    ), None)
+    if calendar is None:
+        raise SystemExit(f"Agenda absent de la liste du compte : {args.calendar_id}")
+
+    def _fetch(time_min, time_max):
+        return get_events_from_calendar(service, calendar["id"], time_min=time_min, time_max=time_max)
+
+    with stage("calendar_fetch") as rec:
+        events = EventArchive().events(
+            calendar_scope(calendar), args.start, args.end + datetime.timedelta(days=1), _fetch, args.tz,
+        )
+        rec["rows"] = len(events)
+    return events
+
+
+def run(args):
+    creds = None
+    if args.token:
+        from google.oauth2.credentials import Credentials
+        from oauth import SCOPES
+        creds = Credentials.from_authorized_user_file(args.token, SCOPES)
+
+    # Transport HTTP : enregistrement ou rejeu de cassette (sinon transport authentifié par défaut)
+    http = None
+    if args.replay:
+        from replay import ReplayHttp
+        http = ReplayHttp(args.replay, latency=args.latency, jitter=args.jitter,
+                          error_rate=args.error_rate, seed=args.seed)
+    elif args.record:
+        from replay import RecordingHttp, authorized_http
+        http = RecordingHttp(authorized_http(creds), args.record)
+    google = creds is not None or http is not None
+
+    try:
+        return _run(args, creds, http, google)
+    finally:
+        if http is not None:
+            http.close()
+
+
+def _run(args, creds, http, google):
+    regex_config = REGLES_PAR_DEFAUT
+    if args.rules:
+        with open(args.rules, encoding="utf-8") as f:
+            regex_config = json.load(f)
+
+    events = load_events(args, creds, http)
+
+    with stage("date_filter") as rec:
+        events = filtrer_evenements_periode(events, args.start, args.end, tz=args.tz)
+        rec["rows"] = len(events)
+
+    with stage("extraction") as rec:
+        df_final = extraire_informations_agenda(events, regex_config, tz=args.tz)
+        rec["rows"] = len(df_final)
+        memoire = df_final.attrs.get("memoire")
+        if memoire:
+            rec["bytes"] = memoire["apres"]
+            print(f"Mémoire des résultats : {memoire['avant'] / 1024 / 1024:.1f} Mo -> {memoire['apres'] / 1024 / 1024:.1f} Mo")
+
+    if args.sheet and google and not df_final.empty:
+        from sheets import get_sheets_service, get_sheet_data, extract_spreadsheet_id, enrichir_donnees
+        sheet_service = get_sheets_service(creds, http=http)
+        with stage("sheet_read") as rec:
+            df_sheet = get_sheet_data(sheet_service, extract_spreadsheet_id(args.sheet))
+            rec["rows"] = len(df_sheet)
+        if not df_sheet.empty:
+            with stage("enrichment") as rec:
+                df_final, pivot_col = enrichir_donnees(df_final, df_sheet)
+                rec["rows"] = len(df_final)
+            print(f"Fusion sur la colonne clé : {pivot_col}" if pivot_col else "Aucune colonne commune avec la Sheet.")
+
+    print(f"{len(df_final)} lignes extraites.")
+
+    if args.output:
+        from export import export_frame
+        fmt = args.output.rsplit(".", 1)[-1].lower()
+        with stage("export") as rec:
+            with export_frame(df_final, fmt) as tmp, open(args.output, "wb") as out:
+                for block in iter(lambda: tmp.read(1024 * 1024), b""):
+                    out.write(block)
+            rec["rows"] = len(df_final)
+
+    if args.template and args.folder and google and not df_final.empty:
+        from invoice import get_services, extract_id_from_url, generate_invoice, build_invoice_payloads
+        col_client = find_client_column(df_final, regex_config)
+        if not col_client:
+            print("Impossible de générer des factures sans colonne 'Client'.", file=sys.stderr)
+            return 1
+        drive_service, docs_service = get_services(creds, http=http)
+        template_id, folder_id = extract_id_from_url(args.template), extract_id_from_url(args.folder)
+        with stage("invoice_payloads") as rec:
+            payloads = build_invoice_payloads(df_final, col_client)
+            rec["rows"] = len(payloads)
+        for client_name, invoice_data in payloads:
+            with stage("invoice"):
+                res = generate_invoice(drive_service, docs_service, template_id, folder_id, invoice_data)
+            print(f"- {client_name}: {res['pdf_link']}")
+    return 0
+
+
+def _date(value):
+    return datetime.date.fromisoformat(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pipeline PatternCal sans interface.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--ics", help="Fichier .ics local")
+    source.add_argument("--ics-url", help="Adresse secrète iCal d'un agenda (téléchargement en flux)")
+    source.add_argument("--calendar-id", help="ID de l'agenda Google (nécessite --token)")
+    parser.add_argument("--token", help="Fichier JSON de credentials (authorized user)")
+    parser.add_argument("--archive", action="store_true",
+                        help="Avec --calendar-id : lit les mois clos dans l'archive locale (.patterncal/archive)")
+    parser.add_argument("--start", type=_date, required=True)
+    parser.add_argument("--end", type=_date, required=True)
+    parser.add_argument("--tz", default=DEFAULT_TZ, help=f"Fuseau de restitution (défaut : {DEFAULT_TZ})")
+    parser.add_argument("--rules", help="Règles JSON ([{name, pattern, type}, ...])")
+    parser.add_argument("--sheet", help="URL de la Google Sheet d'enrichissement")
+    parser.add_argument("--template", help="URL du template Google Doc de facture")
+    parser.add_argument("--folder", help="URL du dossier Drive de destination")
+    parser.add_argument("--output", help="Export des résultats (.csv, .xlsx ou .parquet)")
+    parser.add_argument("--metrics", help="Fichier Prometheus / OpenMetrics des mesures")
+    http_mode = parser.add_mutually_exclusive_group()
+    http_mode.add_argument("--record", help="Enregistre les échanges HTTP dans cette cassette")
+    http_mode.add_argument("--replay", help="Rejoue cette cassette au lieu d'appeler Google")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latence simulée en rejeu (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Écart-type de la latence (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Proportion d'erreurs 429/503 injectées")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--retries", type=int, default=0,
+                        help="Rejeux (backoff exponentiel) des appels Google en 429 / 5xx (défaut : aucun)")
+    args = parser.parse_args(argv)
+
+    if args.calendar_id and not (args.token or args.replay):
+        parser.error("--calendar-id nécessite --token (ou --replay)")
+    if args.record and not args.token:
+        parser.error("--record nécessite --token")
+
+    instrumentation = use_instrumentation(Instrumentation(enabled=bool(args.metrics)))
+    use_retries(args.retries)
+    try:
+        return run(args)
+    finally:
+        if args.metrics:
+            instrumentation.write_openmetrics(args.metrics)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+import time
+import hashlib
+import itertools
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import streamlit as st
+
+from utils import parse_ics_stream
+from instrumentation import current, RETRY_STATUSES
+from shared_cache import get_shared_cache
+
+# Taille des blocs lus sur la connexion (octets, après décompression gzip)
+CHUNK_SIZE = 64 * 1024
+# Délais de connexion / de lecture entre deux blocs (secondes)
+TIMEOUT = (5, 60)
+# Connexions conservées par hôte (calendar.google.com, outlook.office365.com...)
+POOL_SIZE = 10
+# Revalidation (requête conditionnelle) au plus une fois par minute à l'affichage
+REVALIDATE_AFTER = 60
+# Un flux consulté depuis moins de HOT_WINDOW est revalidé en arrière-plan toutes les REFRESH_INTERVAL
+REFRESH_INTERVAL = 10 * 60
+HOT_WINDOW = 60 * 60
+CHECK_INTERVAL = 30  # secondes entre deux passages du thread de refresh
+
+_VERSIONS = itertools.count()
+
+
+def feed_scope(url: str) -> str:
+    """
+    Portée d'un flux iCal privé dans le cache partagé. L'URL secrète vaut
+    autorisation d'accès : seule une session qui la connaît peut en lire le
+    contenu. Elle n'apparaît jamais en clair dans les clés.
+    """
+    return "ical:" + hashlib.sha256(url.strip().encode()).hexdigest()[:32]
+
+
+def new_http_session(pool_size=POOL_SIZE) -> requests.Session:
+    """Session HTTP à connexions réutilisées (keep-alive), rejouée sur erreurs transitoires."""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=RETRY_STATUSES, allowed_methods=["GET"])
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept": "text/calendar", "Accept-Encoding": "gzip"})
+    return session
+
+
+class ICalFeeds:
+    """
+    Flux iCal privés (lien "adresse secrète au format iCal"), partagés par
+    toutes les sessions.
+
+    - Requêtes conditionnelles (If-None-Match / If-Modified-Since) : un flux
+      inchangé ne coûte qu'une réponse 304, les événements en cache sont
+      réutilisés tels quels.
+    - Corps reçu compressé (gzip) et lu par blocs : chaque bloc part
+      directement dans le parseur ICS, le fichier n'est jamais bufferisé.
+    - Un thread d'arrière-plan revalide les flux consultés récemment, la
+      session suivante trouve donc des données déjà à jour.
+
+    Les événements sont rangés dans le cache partagé sous la portée du flux ;
+    s'ils sont évincés, le téléchargement suivant est complet.
+    """
+
+    def __init__(self, cache, session=None, revalidate_after=REVALIDATE_AFTER,
+                 refresh_interval=REFRESH_INTERVAL, hot_window=HOT_WINDOW, check_interval=CHECK_INTERVAL):
+        self.cache = cache
+        self.session = session or new_http_session()
+        self.revalidate_after = revalidate_after
+        self.refresh_interval = refresh_interval
+        self.hot_window = hot_window
+        self.check_interval = check_interval
+        # portée -> {url, etag, last_modified, digest, version, checked, used}
+        self._feeds = {}
+        self._registry_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, url: str, force=False):
+        """
+        Événements du flux et numéro de version (change quand le contenu
+        change). Revalide si la dernière vérification date de plus de
+        `revalidate_after` secondes, ou si `force`.
+        """
+        url = url.strip()
+        scope = feed_scope(url)
+        with self._registry_lock:
+            feed = self._feeds.setdefault(scope, {
+                "url": url, "etag": None, "last_modified": None, "digest": None,
+                "version": None, "checked": 0.0, "used": 0.0,
+            })
+            feed["used"] = time.monotonic()
+        self._ensure_thread()
+
+        events = self.cache.get(scope, "events")
+        if events is None or force or time.monotonic() - feed["checked"] > self.revalidate_after:
+            try:
+                events = self._fetch(scope, feed)
+            except (requests.RequestException, ValueError):
+                # Flux momentanément injoignable ou réponse qui n'est pas un agenda :
+                # la dernière version connue reste affichée
+                if events is None:
+                    raise
+        return events, feed["version"]
+
+    def _fetch(self, scope, feed):
+        with self.cache.lock(scope, "fetch"):
+            events = self.cache.get(scope, "events")
+            # Une autre session vient de revalider
+            if events is not None and time.monotonic() - feed["checked"] <= self.revalidate_after:
+                return events
+
+            headers = {}
+            if events is not None:
+                if feed["etag"]:
+                    headers["If-None-Match"] = feed["etag"]
+                if feed["last_modified"]:
+                    headers["If-Modified-Since"] = feed["last_modified"]
+
+            start = time.perf_counter()
+            nbytes = 0
+            with self.session.get(feed["url"], headers=headers, stream=True, timeout=TIMEOUT) as resp:
+                if resp.status_code == 304 and events is not None:
+                    # Corps vide lu jusqu'au bout : la connexion retourne au pool
+                    resp.content
+                    feed["checked"] = time.monotonic()
+                    current().record_api_call("ical.get", time.perf_counter() - start, 0, 0, 304)
+                    return events
+                resp.raise_for_status()
+
+                digest = hashlib.sha256()
+
+                def _chunks():
+                    nonlocal nbytes
+                    for chunk in resp.iter_content(CHUNK_SIZE):
+                        digest.update(chunk)
+                        nbytes += len(chunk)
+                        yield chunk
+
+                fetched = [e for batch in parse_ics_stream(_chunks()) for e in batch]
+                validators = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+                status = resp.status_code
+            current().record_api_call("ical.get", time.perf_counter() - start, nbytes, 0, status)
+
+            feed["etag"], feed["last_modified"] = validators
+            feed["checked"] = time.monotonic()
+            if events is not None and digest.hexdigest() == feed["digest"]:
+                # Serveur sans validateurs : contenu identique, version conservée
+                return events
+            feed["digest"] = digest.hexdigest()
+            feed["version"] = next(_VERSIONS)
+            return self.cache.put(scope, "events", fetched, dedup=False)
+
+    def forget(self, url: str):
+        scope = feed_scope(url)
+        with self._registry_lock:
+            self._feeds.pop(scope, None)
+        self.cache.invalidate(scope)
+
+    # --- Refresh planifié ---
+
+    def refresh_due(self):
+        """Revalide les flux chauds dont la dernière vérification est ancienne ; oublie les flux froids."""
+        now = time.monotonic()
+        with self._registry_lock:
+            feeds = list(self._feeds.items())
+        for scope, feed in feeds:
+            if now - feed["used"] > self.hot_window:
+                # L'URL secrète n'est pas conservée au-delà de la période d'usage
+                with self._registry_lock:
+                    self._feeds.pop(scope, None)
+                self.cache.invalidate(scope)
+                continue
+            if now - feed["checked"] >= self.refresh_interval:
+                try:
+                    self._fetch(scope, feed)
+                except Exception:
+                    # Flux momentanément indisponible : nouvel essai au passage suivant
+                    pass
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            self.refresh_due()
+
+    def _ensure_thread(self):
+        with self._registry_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="patterncal-ical-refresh", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+@st.cache_resource
+def get_ical_feeds():
+    """Instance unique (pool de connexions et planning de refresh), partagée entre toutes les sessions."""
+    return ICalFeeds(get_shared_cache())
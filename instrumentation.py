@@ -0,0 +1,220 @@
+import time
+import random
+import contextvars
+from contextlib import contextmanager
+import pandas as pd
+from googleapiclient.errors import HttpError
+
+# Codes HTTP pour lesquels un appel Google est rejoué (quota, erreurs serveur)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Méthodes non idempotentes (création de documents, copies Drive...) : une 5xx a pu
+# laisser l'opération appliquée côté serveur, seul le refus de quota (429) est rejoué
+NON_IDEMPOTENT_METHODS = ("POST", "PATCH")
+QUOTA_STATUS = 429
+BACKOFF_BASE = 1.0  # secondes, doublé à chaque tentative
+
+
+class _NoopStage:
+    """Contexte vide utilisé quand l'instrumentation est désactivée."""
+
+    def __enter__(self):
+        # Dictionnaire neuf à chaque étape : rien ne fuit d'une étape (ou d'une session) à l'autre
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_STAGE = _NoopStage()
+
+
+class Instrumentation:
+    """
+    Collecte des mesures d'un passage du pipeline : durée et nombre de lignes
+    de chaque étape, et pour chaque appel d'API Google la durée, le volume
+    transféré et le nombre de tentatives. Désactivée, elle ne coûte qu'un test.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stages = []
+        self.api_calls = []
+
+    def reset(self):
+        self.stages = []
+        self.api_calls = []
+
+    def stage(self, name):
+        """
+        Mesure une étape. Le dict renvoyé peut recevoir des informations
+        complémentaires, ex: `rec["rows"] = len(df)` ou `rec["bytes"] = ...`.
+        """
+        if not self.enabled:
+            return _NOOP_STAGE
+        return self._stage(name)
+
+    @contextmanager
+    def _stage(self, name):
+        record = {"stage": name, "rows": None, "bytes": None}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            self.stages.append(record)
+
+    def record_api_call(self, method, seconds, nbytes, retries, status):
+        if self.enabled:
+            self.api_calls.append({
+                "method": method, "seconds": seconds, "bytes": nbytes,
+                "retries": retries, "status": status,
+            })
+
+    # --- Restitution ---
+
+    def stages_frame(self):
+        return pd.DataFrame(self.stages, columns=["stage", "seconds", "rows", "bytes"])
+
+    def api_frame(self):
+        """Appels d'API agrégés par méthode."""
+        df = pd.DataFrame(self.api_calls, columns=["method", "seconds", "bytes", "retries", "status"])
+        if df.empty:
+            return df
+        return (
+            df.groupby("method")
+            .agg(calls=("method", "size"), seconds=("seconds", "sum"),
+                 bytes=("bytes", "sum"), retries=("retries", "sum"))
+            .reset_index()
+            .sort_values("seconds", ascending=False)
+        )
+
+    def to_openmetrics(self, prefix="patterncal"):
+        """Export au format texte Prometheus / OpenMetrics."""
+        lines = []
+
+        def _metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            suffix = "_total" if kind == "counter" else ""
+            for labels, value in samples:
+                label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{prefix}_{name}{suffix}{{{label_str}}} {value}")
+
+        stages = self.stages_frame()
+        if not stages.empty:
+            by_stage = stages.groupby("stage", sort=False).agg(
+                seconds=("seconds", "sum"), rows=("rows", "sum"), octets=("bytes", "sum")
+            )
+            _metric("stage_seconds", "gauge", "Durée de l'étape du pipeline (s).",
+                    [({"stage": s}, f"{r['seconds']:.6f}") for s, r in by_stage.iterrows()])
+            _metric("stage_rows", "gauge", "Lignes produites par l'étape.",
+                    [({"stage": s}, int(r["rows"])) for s, r in by_stage.iterrows() if r["rows"]])
+            _metric("stage_bytes", "gauge", "Octets lus ou transférés par l'étape.",
+                    [({"stage": s}, int(r["octets"])) for s, r in by_stage.iterrows() if r["octets"]])
+
+        api = self.api_frame()
+        if not api.empty:
+            for column, help_text in [
+                ("calls", "Nombre d'appels d'API Google."),
+                ("seconds", "Temps passé dans les appels d'API Google (s)."),
+                ("bytes", "Octets reçus des API Google."),
+                ("retries", "Tentatives supplémentaires (429 / 5xx)."),
+            ]:
+                name = "api_calls" if column == "calls" else f"api_{column}"
+                _metric(name, "counter", help_text,
+                        [({"method": r.method}, getattr(r, column)) for r in api.itertuples()])
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write_openmetrics(self, path, prefix="patterncal"):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_openmetrics(prefix))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Instance courante (par thread de session Streamlit ou exécution headless)
+_current = contextvars.ContextVar("patterncal_instrumentation", default=Instrumentation(enabled=False))
+# Nombre de rejeux des appels Google (0 : aucun rejeu, aucune attente)
+_retries = contextvars.ContextVar("patterncal_api_retries", default=0)
+
+
+def use(instrumentation):
+    """Définit l'instrumentation active pour le contexte courant."""
+    _current.set(instrumentation)
+    return instrumentation
+
+
+def current():
+    return _current.get()
+
+
+def stage(name):
+    """Raccourci : mesure une étape avec l'instrumentation courante."""
+    return _current.get().stage(name)
+
+
+def use_retries(num_retries):
+    """
+    Active le rejeu des appels Google pour le contexte courant (désactivé par
+    défaut : sans cet appel, `execute` ne rejoue ni n'attend jamais).
+    """
+    _retries.set(num_retries)
+    return num_retries
+
+
+def _measure_response(request, sizes):
+    # Taille du corps brut reçu du transport, relevée avant désérialisation
+    postproc = getattr(request, "postproc", None)
+    if postproc is None:
+        return
+
+    def _postproc(resp, content):
+        sizes.append(len(content or b""))
+        return postproc(resp, content)
+
+    request.postproc = _postproc
+
+
+def execute(request, num_retries=None):
+    """
+    Exécute une requête googleapiclient et enregistre l'appel dans
+    l'instrumentation courante. Le rejeu (backoff exponentiel sur 429 / 5xx,
+    seulement 429 pour les POST / PATCH) est optionnel : `num_retries`, ou à
+    défaut la valeur fixée par `use_retries()` (0 par défaut).
+    """
+    inst = _current.get()
+    if num_retries is None:
+        num_retries = _retries.get()
+    sizes = []
+    if inst.enabled:
+        _measure_response(request, sizes)
+    retryable = (
+        (QUOTA_STATUS,) if str(getattr(request, "method", "GET")).upper() in NON_IDEMPOTENT_METHODS
+        else RETRY_STATUSES
+    )
+    retries = 0
+    start = time.perf_counter()
+    while True:
+        try:
+            response = request.execute()
+            break
+        except HttpError as e:
+            if e.resp.status not in retryable or retries >= num_retries:
+                inst.record_api_call(_method_name(request), time.perf_counter() - start,
+                                     0, retries, e.resp.status)
+                raise
+            time.sleep(BACKOFF_BASE * (2 ** retries) * (1 + random.random() / 2))
+            retries += 1
+
+    if inst.enabled:
+        inst.record_api_call(_method_name(request), time.perf_counter() - start,
+                             sum(sizes), retries, 200)
+    return response
+
+
+def _method_name(request):
+    return getattr(request, "methodId", None) or type(request).__name__
@@ -1,10 +1,16 @@
 import re
 import io
+import numpy as np
+import pandas as pd
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseUpload
 
-def get_services(creds):
-    """Retourne les services Drive et Docs."""
+from instrumentation import execute
+
+def get_services(creds, http=None):
+    """Retourne les services Drive et Docs (transport `http` optionnel, ex: replay)."""
+    if http is not None:
+        return build('drive', 'v3', http=http), build('docs', 'v1', http=http)
     drive_service = build('drive', 'v3', credentials=creds)
     docs_service = build('docs', 'v1', credentials=creds)
     return drive_service, docs_service
@@ -24,6 +30,67 @@ def extract_id_from_url(url):
         
     return url # Retourne l'URL tel quel si pas de match (peut-être déjà un ID)
 
+def find_amount_column(columns):
+    """Retourne la première colonne ressemblant à un montant (montant/price/eur), sinon None."""
+    for col in columns:
+        if "montant" in col.lower() or "price" in col.lower() or "eur" in col.lower():
+            return col
+    return None
+
+def build_invoice_payloads(df, col_client, date_col="Date"):
+    """
+    Prépare en une passe vectorisée les données de facture de chaque client.
+
+    Un seul groupby fournit : les champs statiques (première ligne du groupe,
+    NaN -> ""), le nombre de prestations, le coût total et la liste des dates
+    déjà formatées. Retourne une liste de (client, dict de données).
+    """
+    df = df[df[col_client].notna()]
+    if df.empty:
+        return []
+
+    keys = df[col_client]
+    grouped = df.groupby(keys, sort=True, observed=True)
+
+    # 1. Champs statiques : première ligne de chaque groupe
+    first_rows = grouped.head(1).set_index(col_client, drop=False)
+    first_rows = first_rows.astype(object).where(first_rows.notna(), "")
+
+    # 2. Champs calculés
+    nb_presta = grouped.size()
+
+    amount_col = find_amount_column(df.columns)
+    if amount_col is not None:
+        # On force la conversion en numérique pour éviter la concaténation de str
+        # Somme en float64 (les montants peuvent être stockés en float32)
+        montants = pd.to_numeric(df[amount_col], errors="coerce").astype("float64")
+        cout_total = montants.groupby(keys, observed=True).sum()
+    else:
+        cout_total = pd.Series(0.0, index=nb_presta.index)
+
+    if date_col in df.columns:
+        dates = df[date_col]
+        if pd.api.types.is_datetime64_any_dtype(dates):
+            # strftime est coûteux : on ne formate que les jours distincts
+            codes, jours = pd.factorize(dates.dt.normalize())
+            # Dernière case : valeur des dates manquantes (code -1), y compris si toutes le sont
+            formatted = np.append(jours.strftime("%d/%m/%Y").to_numpy(dtype=object), None)
+            dates = pd.Series(formatted[codes], index=df.index, dtype=object)
+        else:
+            dates = dates.astype(str)
+        liste_dates = dates.dropna().groupby(keys, observed=True).agg(", ".join)
+    else:
+        liste_dates = pd.Series(dtype=object)
+
+    payloads = []
+    for client_name, static in zip(first_rows.index, first_rows.to_dict("records")):
+        static["CLIENT_NOM"] = client_name
+        static["NOMBRE_PRESTATION"] = int(nb_presta[client_name])
+        static["COUT_TOTAL"] = f"{cout_total.get(client_name, 0.0):.2f} €"
+        static["LISTE_DATE_PRESTATION"] = liste_dates.get(client_name, "")
+        payloads.append((client_name, static))
+    return payloads
+
 def generate_invoice(drive_service, docs_service, template_id, folder_id, data):
     """
     Génère une facture à partir d'un template Google Doc.
@@ -43,10 +110,10 @@ def generate_invoice(drive_service, docs_service, template_id, folder_id, data):
         'parents': [folder_id]
     }
     
-    copy_response = drive_service.files().copy(
+    copy_response = execute(drive_service.files().copy(
         fileId=template_id,
         body=file_metadata
-    ).execute()
+    ))
     new_doc_id = copy_response.get('id')
     
     if not new_doc_id:
@@ -71,16 +138,16 @@ def generate_invoice(drive_service, docs_service, template_id, folder_id, data):
             }
         })
         
-    docs_service.documents().batchUpdate(
+    execute(docs_service.documents().batchUpdate(
         documentId=new_doc_id,
         body={'requests': requests}
-    ).execute()
+    ))
     
     # 3. Export en PDF
-    pdf_content = drive_service.files().export(
+    pdf_content = execute(drive_service.files().export(
         fileId=new_doc_id,
         mimeType='application/pdf'
-    ).execute()
+    ))
     
     # 4. Upload du PDF dans le même dossier
     file_metadata_pdf = {
@@ -90,11 +157,11 @@ def generate_invoice(drive_service, docs_service, template_id, folder_id, data):
     
     media = MediaIoBaseUpload(io.BytesIO(pdf_content), mimetype='application/pdf', resumable=True)
     
-    pdf_file = drive_service.files().create(
+    pdf_file = execute(drive_service.files().create(
         body=file_metadata_pdf,
         media_body=media,
         fields='id, webViewLink'
-    ).execute()
+    ))
     
     return {
         "doc_id": new_doc_id,
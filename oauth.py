@@ -1,4 +1,5 @@
 import os.path
+import contextlib
 import datetime
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
@@ -6,6 +7,8 @@ from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
 import streamlit as st
 
+from instrumentation import execute
+
 # Scopes nécessaires (Lecture seule Calendar, accès Drive et Docs pour facturation)
 SCOPES = [
     'https://www.googleapis.com/auth/calendar.readonly',
@@ -63,17 +66,27 @@ def get_credentials_from_code(code, redirect_uri):
         st.error(f"Erreur échange token: {e}")
         return None
 
-def get_calendar_service(creds):
-    """Construit le service API à partir des credentials."""
+def get_calendar_service(creds, http=None, lock=None):
+    """
+    Construit le service API à partir des credentials.
+    `http` (ex: replay.ReplayHttp) remplace le transport authentifié par défaut.
+    `lock` (ex: CredentialManager.lock(sid)) sérialise le refresh avec le thread
+    de refresh anticipé.
+    """
+    if http is not None:
+        return build('calendar', 'v3', http=http)
+
     if not creds:
         return None
     
-    # Refresh si nécessaire
+    # Refresh si nécessaire (re-vérifié sous verrou : un autre thread a pu le faire)
     if creds.expired and creds.refresh_token:
-        try:
-            creds.refresh(Request())
-        except Exception:
-            return None # Token invalide, il faudra se reconnecter
+        with lock or contextlib.nullcontext():
+            if creds.expired:
+                try:
+                    creds.refresh(Request())
+                except Exception:
+                    return None # Token invalide, il faudra se reconnecter
 
     # Construction du service
     service = build('calendar', 'v3', credentials=creds)
@@ -81,143 +94,66 @@ def get_calendar_service(creds):
 
 def list_calendars(service):
     """Liste les agendas disponibles pour l'utilisateur."""
-    # ... (Code existant inchangé)
     page_token = None
     calendars = []
     while True:
-        calendar_list = service.calendarList().list(pageToken=page_token).execute()
+        calendar_list = execute(service.calendarList().list(pageToken=page_token))
         for calendar_list_entry in calendar_list['items']:
             calendars.append({
                 "id": calendar_list_entry['id'], 
-                "summary": calendar_list_entry['summary']
+                "summary": calendar_list_entry['summary'],
+                "accessRole": calendar_list_entry.get('accessRole'),
+                "primary": calendar_list_entry.get('primary', False),
             })
         page_token = calendar_list.get('nextPageToken')
         if not page_token:
             break
     return calendars
 
-def get_events_from_calendar(service, calendar_id, days_back=30):
-    """Récupère les événements (Code existant inchangé)"""
-    # ...
-    # Copie du code précédent pour get_events_from_calendar et _parse_google_date
-    # Je dois m'assurer de remettre tout le contenu des fonctions ici.
+def get_events_from_calendar(service, calendar_id, days_back=30, time_min=None, time_max=None, q=None):
+    """
+    Récupère les événements et les transforme en format compatible parse_ics (liste de dicts).
+    dtstart / dtend restent les chaînes ISO 8601 de l'API ("date" ou "dateTime") :
+    fuseaux et durées sont traités par lot (datetimes.normalize_events).
+
+    La fenêtre est bornée côté serveur par time_min/time_max (datetime UTC naive).
+    A défaut de time_min, on remonte de days_back jours. q est transmis tel quel
+    à l'API (recherche plein texte) pour pré-filtrer les événements.
+    """
     
     # Conversion date RFC3339
-    now = datetime.datetime.utcnow()
-    start_date = (now - datetime.timedelta(days=days_back)).isoformat() + 'Z'
-    
-    events_result = service.events().list(calendarId=calendar_id, timeMin=start_date,
-                                          singleEvents=True,
-                                          orderBy='startTime').execute()
-    events = events_result.get('items', [])
-
-    normalized_events = []
-    if not events:
-        return []
-        
-    for event in events:
-        start = event['start'].get('dateTime', event['start'].get('date'))
-        end = event['end'].get('dateTime', event['end'].get('date'))
-        summary = event.get('summary', 'Sans titre')
-        
-        dtstart = _parse_google_date(start)
-        dtend = _parse_google_date(end)
-        
-        duration = datetime.timedelta(0)
-        if isinstance(dtstart, datetime.datetime) and isinstance(dtend, datetime.datetime):
-             if dtstart.tzinfo and not dtend.tzinfo:
-                 dtend = dtend.replace(tzinfo=dtstart.tzinfo)
-             duration = dtend - dtstart
-        elif not isinstance(dtstart, datetime.datetime): 
-             duration = dtend - dtstart
-
-        normalized_events.append({
-            "summary": summary,
-            "dtstart": dtstart,
-            "dtend": dtend,
-            "duration": duration
-        })
-        
-    return normalized_events
-
-def _parse_google_date(date_str):
-    """Transforme une string date Google en objet datetime ou date python."""
-    try:
-        if 'T' in date_str:
-            return datetime.datetime.fromisoformat(date_str)
-        else:
-            return datetime.date.fromisoformat(date_str)
-    except ValueError:
-        return date_str
-
-def list_calendars(service):
-    """Liste les agendas disponibles pour l'utilisateur."""
+    if time_min is None:
+        now = datetime.datetime.utcnow()
+        time_min = now - datetime.timedelta(days=days_back)
+
+    params = {
+        "calendarId": calendar_id,
+        "timeMin": time_min.isoformat() + 'Z',  # 'Z' indicates UTC time
+        "singleEvents": True,
+        "orderBy": 'startTime',
+        "maxResults": 2500,
+    }
+    if time_max is not None:
+        params["timeMax"] = time_max.isoformat() + 'Z'
+    if q:
+        params["q"] = q
+
+    # Pagination : l'API renvoie au plus maxResults événements par page
+    events = []
     page_token = None
-    calendars = []
     while True:
-        calendar_list = service.calendarList().list(pageToken=page_token).execute()
-        for calendar_list_entry in calendar_list['items']:
-            calendars.append({
-                "id": calendar_list_entry['id'], 
-                "summary": calendar_list_entry['summary']
-            })
-        page_token = calendar_list.get('nextPageToken')
+        events_result = execute(service.events().list(pageToken=page_token, **params))
+        events.extend(events_result.get('items', []))
+        page_token = events_result.get('nextPageToken')
         if not page_token:
             break
-    return calendars
-
-def get_events_from_calendar(service, calendar_id, days_back=30):
-    """Récupère les événements et les transforme en format compatible parse_ics (liste de dicts)."""
-    
-    # Conversion date RFC3339
-    now = datetime.datetime.utcnow()
-    start_date = (now - datetime.timedelta(days=days_back)).isoformat() + 'Z'  # 'Z' indicates UTC time
-    
-    events_result = service.events().list(calendarId=calendar_id, timeMin=start_date,
-                                          singleEvents=True,
-                                          orderBy='startTime').execute()
-    events = events_result.get('items', [])
-
-    normalized_events = []
-    if not events:
-        return []
-        
-    for event in events:
-        start = event['start'].get('dateTime', event['start'].get('date'))
-        end = event['end'].get('dateTime', event['end'].get('date'))
-        summary = event.get('summary', 'Sans titre')
-        
-        # Parsing des dates (c'est souvent des str ISO)
-        # On utilise une fonction helper pour normaliser
-        dtstart = _parse_google_date(start)
-        dtend = _parse_google_date(end)
-        
-        # Calcul durée
-        duration = datetime.timedelta(0)
-        if isinstance(dtstart, datetime.datetime) and isinstance(dtend, datetime.datetime):
-             if dtstart.tzinfo and not dtend.tzinfo:
-                 dtend = dtend.replace(tzinfo=dtstart.tzinfo)
-             duration = dtend - dtstart
-        elif not isinstance(dtstart, datetime.datetime): 
-             # Cas Date pure (all day)
-             duration = dtend - dtstart
-
-        normalized_events.append({
-            "summary": summary,
-            "dtstart": dtstart,
-            "dtend": dtend,
-            "duration": duration
-        })
-        
-    return normalized_events
 
-def _parse_google_date(date_str):
-    """Transforme une string date Google en objet datetime ou date python."""
-    # Format '2023-11-23T10:00:00+01:00' (dateTime) ou '2023-11-23' (date)
-    try:
-        if 'T' in date_str:
-            return datetime.datetime.fromisoformat(date_str)
-        else:
-            return datetime.date.fromisoformat(date_str)
-    except ValueError:
-        return date_str # Fallback
+    return [
+        {
+            "id": event.get('id'),
+            "summary": event.get('summary', 'Sans titre'),
+            "dtstart": event['start'].get('dateTime', event['start'].get('date')),
+            "dtend": event['end'].get('dateTime', event['end'].get('date')),
+        }
+        for event in events
+    ]
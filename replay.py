@@ -0,0 +1,181 @@
+"""
+Couche HTTP d'enregistrement / rejeu pour les API Google.
+
+Les objets de ce module se passent à l'argument `http` de
+googleapiclient.discovery.build (voir `http=` de get_calendar_service,
+get_services et get_sheets_service) :
+
+    # Enregistrement d'échanges réels
+    http = RecordingHttp(authorized_http(creds), "cassettes/facturation.json")
+    drive_service, docs_service = get_services(None, http=http)
+    ...
+    http.save()
+
+    # Rejeu hors ligne, avec latence et erreurs injectées
+    http = ReplayHttp("cassettes/facturation.json", latency=0.08, jitter=0.02,
+                      error_rate=0.05, error_statuses=(429, 503), seed=1)
+    drive_service, docs_service = get_services(None, http=http)
+
+Le rejeu est déterministe (graine fixe) et thread-safe : il permet de mesurer
+concurrence, backoff (instrumentation.execute) et cache sans réseau ni quota.
+"""
+import json
+import time
+import base64
+import random
+import hashlib
+import threading
+from urllib.parse import urlsplit, parse_qsl, urlencode, urlunsplit
+import httplib2
+
+CASSETTE_VERSION = 1
+
+# En-têtes de réponse jamais enregistrés
+_SKIPPED_HEADERS = {"set-cookie", "status", "content-location"}
+
+
+def authorized_http(creds):
+    """Transport httplib2 authentifié, à envelopper dans RecordingHttp."""
+    import google_auth_httplib2
+    return google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+
+
+def _normalize_uri(uri):
+    # Paramètres triés et sans clé d'API : l'ordre des paramètres ne doit pas compter
+    parts = urlsplit(uri)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != "key")
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+
+def _body_bytes(body):
+    if body is None:
+        return b""
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    if hasattr(body, "read"):
+        return body.read()
+    return bytes(body)
+
+
+def _key(method, uri, body, match_body):
+    key = f"{method.upper()} {_normalize_uri(uri)}"
+    if match_body:
+        key += " " + hashlib.sha256(_body_bytes(body)).hexdigest()
+    return key
+
+
+class RecordingHttp:
+    """Transport qui délègue à un vrai client HTTP et enregistre chaque échange."""
+
+    def __init__(self, http, cassette_path, match_body=False):
+        self.http = http
+        self.cassette_path = cassette_path
+        self.match_body = match_body
+        self.interactions = []
+        self._lock = threading.Lock()
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        data = _body_bytes(body)
+        resp, content = self.http.request(uri, method=method, body=data or None, headers=headers, **kwargs)
+        interaction = {
+            "key": _key(method, uri, data, self.match_body),
+            "request": {"method": method.upper(), "uri": _normalize_uri(uri)},
+            "response": {
+                "status": resp.status,
+                "headers": {k: v for k, v in dict(resp).items() if k.lower() not in _SKIPPED_HEADERS},
+                "body": base64.b64encode(content or b"").decode("ascii"),
+            },
+        }
+        with self._lock:
+            self.interactions.append(interaction)
+        return resp, content
+
+    def save(self):
+        with self._lock:
+            payload = {
+                "version": CASSETTE_VERSION,
+                "match_body": self.match_body,
+                "interactions": list(self.interactions),
+            }
+        with open(self.cassette_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=1)
+
+    def close(self):
+        self.save()
+
+
+class ReplayHttp:
+    """
+    Transport qui rejoue une cassette. Les réponses d'une même requête
+    (méthode + URI, + corps si match_body) sont servies dans l'ordre
+    d'enregistrement, puis en boucle si `loop` (tests de charge).
+
+    - latency / jitter : délai simulé par requête (secondes, loi normale tronquée).
+    - error_rate / error_statuses : proportion de requêtes remplacées par une
+      erreur injectée (ex: 429, 503) pour exercer le backoff.
+    """
+
+    def __init__(self, cassette_path, latency=0.0, jitter=0.0, error_rate=0.0,
+                 error_statuses=(429, 503), loop=True, seed=0, sleep=time.sleep):
+        with open(cassette_path, encoding="utf-8") as f:
+            cassette = json.load(f)
+        self.match_body = cassette.get("match_body", False)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.loop = loop
+        self._sleep = sleep
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._responses = {}
+        self._cursor = {}
+        for interaction in cassette["interactions"]:
+            self._responses.setdefault(interaction["key"], []).append(interaction["response"])
+        self.stats = {"served": 0, "injected_errors": 0, "misses": 0}
+
+    def _next_response(self, key):
+        responses = self._responses.get(key)
+        if not responses:
+            return None
+        index = self._cursor.get(key, 0)
+        if index >= len(responses):
+            if not self.loop:
+                return None
+            index = 0
+        self._cursor[key] = index + 1
+        return responses[index]
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        key = _key(method, uri, body, self.match_body)
+        with self._lock:
+            delay = max(0.0, self._rng.gauss(self.latency, self.jitter)) if self.latency else 0.0
+            inject = self.error_rate and self._rng.random() < self.error_rate
+            status = self._rng.choice(self.error_statuses) if inject else None
+            recorded = None if inject else self._next_response(key)
+            if inject:
+                self.stats["injected_errors"] += 1
+            elif recorded is None:
+                self.stats["misses"] += 1
+            else:
+                self.stats["served"] += 1
+
+        if delay:
+            self._sleep(delay)
+
+        if inject:
+            return self._error(status, "Erreur injectée par ReplayHttp")
+        if recorded is None:
+            return self._error(404, f"Aucune réponse enregistrée pour {key}")
+
+        resp = httplib2.Response(dict(recorded["headers"], status=str(recorded["status"])))
+        return resp, base64.b64decode(recorded["body"])
+
+    @staticmethod
+    def _error(status, message):
+        body = json.dumps({"error": {"code": status, "message": message}}).encode()
+        resp = httplib2.Response({"status": str(status), "content-type": "application/json"})
+        return resp, body
+
+    def close(self):
+        pass
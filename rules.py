@@ -0,0 +1,380 @@
+import re
+import time
+
+try:
+    from re import _parser as sre_parse  # Python >= 3.11
+    from re import _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+# Le module `regex` permet d'interrompre une recherche (timeout) et libère le GIL
+# pendant le matching (concurrent=True) : une règle pathologique ne bloque pas
+# les autres sessions. A défaut, on se rabat sur `re` sans interruption possible.
+try:
+    import regex as regex_engine
+    TIMEOUT_SUPPORTED = True
+except ImportError:
+    regex_engine = re
+    TIMEOUT_SUPPORTED = False
+
+# Temps maximal d'une recherche (secondes) : au-delà, la règle est jugée pathologique
+RULE_SEARCH_TIMEOUT = 0.05
+# Motifs combinés conservés par RuleMatcher (un par ensemble de règles candidates)
+MERGED_CACHE_SIZE = 4096
+# Temps cumulé par règle et par lot : RULE_TIME_BUDGET, augmenté de RULE_TIME_PER_EVENT par titre
+RULE_TIME_BUDGET = 1.0
+RULE_TIME_PER_EVENT = 0.001
+
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+_UNBOUNDED = sre_constants.MAXREPEAT
+
+
+class RuleTimeout(Exception):
+    """Une règle a dépassé son budget de temps."""
+
+
+def _children(op, av):
+    """Sous-motifs d'un noeud du parseur sre."""
+    if op in _REPEATS or (hasattr(sre_constants, "POSSESSIVE_REPEAT") and op is sre_constants.POSSESSIVE_REPEAT):
+        return [av[2]]
+    if op is sre_constants.SUBPATTERN:
+        return [av[-1]]
+    if op is sre_constants.BRANCH:
+        return list(av[1])
+    if op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+        return [av[1]]
+    if op is sre_constants.GROUPREF_EXISTS:
+        return [b for b in av[1:] if b is not None]
+    return []
+
+
+def _contains(items, predicate):
+    for op, av in items:
+        if predicate(op, av):
+            return True
+        if any(_contains(child, predicate) for child in _children(op, av)):
+            return True
+    return False
+
+
+def _is_multi_repeat(op, av):
+    return op in _REPEATS and av[1] > 1
+
+
+def _only_repeats(items):
+    """Vrai si le motif n'est composé que d'éléments quantifiés (aucun élément fixe)."""
+    if not items:
+        return False
+    for op, av in items:
+        if op in _REPEATS:
+            continue
+        if op is sre_constants.SUBPATTERN and _only_repeats(av[-1]):
+            continue
+        return False
+    return True
+
+
+def analyser_complexite(pattern: str) -> list[str]:
+    """
+    Analyse statique d'une regex : signale les constructions exposées au
+    backtracking catastrophique (ReDoS). Liste vide si rien à signaler.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return []
+
+    warnings = []
+
+    def _walk(items):
+        for op, av in items:
+            if _is_multi_repeat(op, av):
+                body = av[2]
+                # Quantificateur imbriqué sans séparateur obligatoire : (a+)+, (\w+\s?)*...
+                # ([A-Z][a-z]+)+ reste accepté : chaque itération commence par un motif fixe
+                if _contains(body, _is_multi_repeat) and _only_repeats(body):
+                    warnings.append("quantificateurs imbriqués")
+                # Alternative répétée : (a|aa)+, (\w|\d)*...
+                elif av[1] == _UNBOUNDED and _contains(body, lambda o, a: o is sre_constants.BRANCH):
+                    warnings.append("alternative sous un quantificateur non borné")
+            for child in _children(op, av):
+                _walk(child)
+
+    _walk(parsed)
+    # Dédoublonnage en conservant l'ordre
+    return list(dict.fromkeys(warnings))
+
+
+def compile_rules(regex_configs: list[dict]) -> list[dict]:
+    """
+    Compile les règles d'extraction. Chaque règle compilée porte son analyse
+    de complexité ("warnings") et, le cas échéant, la raison de sa
+    désactivation ("disabled"). Les règles invalides sont ignorées.
+    """
+    compiled = []
+    for config in regex_configs:
+        try:
+            flag = regex_engine.IGNORECASE if config["type"] == "number" else 0
+            pattern = regex_engine.compile(config["pattern"], flag)
+        except (re.error, regex_engine.error):
+            continue
+
+        warnings = analyser_complexite(config["pattern"])
+        disabled = None
+        if warnings and not TIMEOUT_SUPPORTED:
+            # Sans timeout possible, une règle risquée pourrait figer le serveur
+            disabled = f"Règle '{config['name']}' désactivée : {', '.join(warnings)}."
+
+        compiled.append({
+            "name": config["name"],
+            "regex": pattern,
+            "type": config["type"],
+            "warnings": warnings,
+            "disabled": disabled,
+            # Sans risque signalé, la règle peut rejoindre le motif combiné (RuleMatcher.search_merged)
+            "mergeable": not warnings and _mergeable(config["pattern"]),
+        })
+    return compiled
+
+
+def _mergeable(pattern: str) -> bool:
+    """
+    Vrai si la règle garde le même sens une fois intégrée à un motif combiné :
+    syntaxe `re` standard, ni drapeau global en ligne (ex: "(?i)"), ni groupe
+    nommé (collisions entre règles), ni référence arrière (numéros décalés).
+    """
+    try:
+        compiled = re.compile(pattern)
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return False
+    if compiled.flags & ~re.UNICODE or compiled.groupindex:
+        return False
+    return not _contains(parsed, lambda op, av: op in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS))
+
+
+def rule_budget(nb_texts: int) -> float:
+    """Budget cumulé d'une règle pour un lot de `nb_texts` titres (proportionnel à la taille du lot)."""
+    return RULE_TIME_BUDGET + nb_texts * RULE_TIME_PER_EVENT
+
+
+class RuleBudget:
+    """
+    Budget de temps d'une règle pour un lot d'événements : chaque recherche
+    est bornée à `search_timeout`, l'ensemble du lot à `budget`.
+    """
+
+    def __init__(self, rule, budget=RULE_TIME_BUDGET, search_timeout=RULE_SEARCH_TIMEOUT):
+        self.rule = rule
+        self.remaining = budget
+        self.search_timeout = search_timeout
+
+    def search(self, text):
+        """Recherche bornée en temps ; lève RuleTimeout si la recherche ou le budget dépasse."""
+        if self.remaining <= 0:
+            raise RuleTimeout(self.rule["name"])
+        start = time.perf_counter()
+        try:
+            if TIMEOUT_SUPPORTED:
+                timeout = min(self.search_timeout, self.remaining)
+                match = self.rule["regex"].search(text, timeout=timeout, concurrent=True)
+            else:
+                match = self.rule["regex"].search(text)
+        except TimeoutError:
+            self.remaining = 0
+            raise RuleTimeout(self.rule["name"])
+        elapsed = time.perf_counter() - start
+        self.remaining -= elapsed
+        if elapsed > self.search_timeout:
+            # Sans `regex`, la recherche n'a pu être interrompue : dépassement constaté après coup
+            self.remaining = 0
+            raise RuleTimeout(self.rule["name"])
+        return match
+
+
+# --- Préfiltrage multi-règles ---
+
+def _flatten(items):
+    # Les groupes n'interrompent pas une suite de littéraux : "Pro(jet)" -> "Projet"
+    for op, av in items:
+        if op is sre_constants.SUBPATTERN:
+            yield from _flatten(av[-1])
+        else:
+            yield op, av
+
+
+def _literal_runs(items):
+    """
+    Littéraux obligatoires d'une séquence sre : liste de candidats, chacun
+    étant un ensemble d'alternatives dont au moins une figure dans tout texte
+    reconnu. Les suites de LITERAL consécutifs sont concaténées.
+    """
+    candidates = []
+    run = []
+
+    def _flush():
+        if run:
+            candidates.append({"".join(run)})
+            run.clear()
+
+    for op, av in _flatten(items):
+        if op is sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        _flush()
+        if op in _REPEATS and av[0] >= 1:
+            candidates.extend(_literal_runs(av[2]))
+        elif op is sre_constants.BRANCH:
+            alternatives = set()
+            for branch in av[1]:
+                best = _best_literals(_literal_runs(branch))
+                if not best:
+                    # Une branche sans littéral obligatoire : rien d'exploitable
+                    alternatives = None
+                    break
+                alternatives |= best
+            if alternatives:
+                candidates.append(alternatives)
+        elif op is sre_constants.IN:
+            # Classe réduite à un caractère (ex: [€])
+            chars = [a for o, a in av if o is sre_constants.LITERAL]
+            if len(chars) == len(av):
+                candidates.append({chr(c) for c in chars})
+    _flush()
+    return candidates
+
+
+def _best_literals(candidates):
+    # Le candidat le plus sélectif : alternatives les plus courtes les plus longues possible
+    if not candidates:
+        return None
+    return max(candidates, key=lambda alts: (min(len(a) for a in alts), -len(alts)))
+
+
+def required_literals(pattern: str) -> set[str] | None:
+    """
+    Ensemble de littéraux (casefold) dont au moins un apparaît dans tout titre
+    reconnu par `pattern`, ou None si la règle doit être tentée sur tous les titres.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return None
+    best = _best_literals(_literal_runs(parsed))
+    if not best:
+        return None
+    return {lit.casefold() for lit in best}
+
+
+def _trie_pattern(words):
+    """Regex en arbre de préfixes : une seule passe, branche choisie caractère par caractère."""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def _emit(node):
+        terminal = "" in node
+        branches = [re.escape(c) + _emit(sub) for c, sub in sorted(node.items()) if c]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            # Optionnel gourmand : le littéral le plus long à cette position
+            return "(?:" + body + ")?" if len(branches) > 1 or len(body) > 1 else body + "?"
+        return body
+
+    return _emit(trie)
+
+
+class RuleMatcher:
+    """
+    Analyse un jeu de règles compilées une fois pour toutes, puis indique pour
+    chaque titre les seules règles susceptibles de le reconnaître. Les
+    littéraux obligatoires de toutes les règles sont cherchés en une seule
+    passe ; les règles sans littéral exploitable sont toujours tentées.
+
+    Les règles candidates "mergeable" d'un titre sont ensuite exécutées en une
+    seule recherche (search_merged) : un motif combiné par ensemble de règles
+    candidates, compilé à la première occurrence et mis en cache.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self._merged = {}
+        self.always = []
+        self._by_literal = {}
+        for index, rule in enumerate(self.rules):
+            literals = required_literals(rule["regex"].pattern)
+            if literals is None:
+                self.always.append(index)
+            else:
+                for literal in literals:
+                    self._by_literal.setdefault(literal, []).append(index)
+
+        self._scanner = None
+        if self._by_literal:
+            # Lookahead : chaque position est examinée, les occurrences qui se chevauchent sont vues
+            self._scanner = re.compile("(?=(" + _trie_pattern(self._by_literal) + "))")
+            # Un littéral trouvé implique la présence de ceux qu'il contient
+            self._implied = {
+                lit: sorted({i for other, idx in self._by_literal.items() if other in lit for i in idx})
+                for lit in self._by_literal
+            }
+
+    def candidates(self, text):
+        """Règles (dans l'ordre de la configuration) à tenter sur `text`."""
+        if self._scanner is None:
+            return self.rules
+        found = set(self.always)
+        for literal in {m.group(1) for m in self._scanner.finditer(text.casefold())}:
+            found.update(self._implied[literal])
+        return [self.rules[i] for i in sorted(found)]
+
+    def _merged_pattern(self, rules):
+        key = tuple(rule["name"] for rule in rules)
+        merged = self._merged.get(key)
+        if merged is None:
+            if len(self._merged) >= MERGED_CACHE_SIZE:
+                self._merged.clear()
+            parts = []
+            for index, rule in enumerate(rules):
+                body = rule["regex"].pattern
+                if rule["regex"].flags & regex_engine.IGNORECASE:
+                    body = "(?i:" + body + ")"
+                # Lookahead depuis le début : chaque règle trouve sa première occurrence,
+                # comme une recherche indépendante ; alternative vide si elle est absente
+                parts.append(f"(?:(?=[\\s\\S]*?(?P<r{index}>{body}))|)")
+            pattern = regex_engine.compile("".join(parts))
+            merged = self._merged[key] = (pattern, [
+                (f"r{index}", pattern.groupindex[f"r{index}"] + 1 if rule["regex"].groups else None)
+                for index, rule in enumerate(rules)
+            ])
+        return merged
+
+    def search_merged(self, text, rules, timeout=RULE_SEARCH_TIMEOUT):
+        """
+        Exécute en une seule recherche les règles `rules` (toutes "mergeable")
+        et retourne {nom: valeur brute (groupe 1, sinon correspondance entière) ou None}.
+        Retourne None si la recherche dépasse `timeout` : les règles sont alors
+        exécutées une à une, sous leur budget.
+        """
+        pattern, groups = self._merged_pattern(rules)
+        try:
+            if TIMEOUT_SUPPORTED:
+                match = pattern.match(text, timeout=timeout, concurrent=True)
+            else:
+                match = pattern.match(text)
+        except TimeoutError:
+            return None
+        values = {}
+        for rule, (whole, first) in zip(rules, groups):
+            if match.group(whole) is None:
+                values[rule["name"]] = None
+            else:
+                values[rule["name"]] = match.group(first if first is not None else whole)
+        return values
+
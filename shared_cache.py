@@ -0,0 +1,234 @@
+import os
+import sys
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import pandas as pd
+import streamlit as st
+
+# Budget mémoire global du cache partagé (Mo), modifiable par PATTERNCAL_CACHE_MB
+DEFAULT_BUDGET_MB = 512
+# Durées de vie (secondes) : liste des agendas, tranches d'événements récupérées, Sheets
+CALENDAR_LIST_TTL = 300
+RANGES_TTL = 15 * 60
+SHEET_TTL = 300
+# Nombre d'éléments examinés pour estimer la taille d'une liste d'événements
+SIZE_SAMPLE = 200
+
+# Rôles Google Calendar -> niveau de visibilité des données récupérées
+_ROLE_LEVELS = {"owner": "full", "writer": "full", "reader": "reader", "freeBusyReader": "freebusy"}
+
+
+def _sizeof_event(event):
+    size = sys.getsizeof(event)
+    for key, value in event.items():
+        size += sys.getsizeof(key) + sys.getsizeof(value)
+    return size
+
+
+def estimate_size(value) -> int:
+    """Taille approximative en octets (DataFrame exact, listes d'événements par échantillon)."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return sys.getsizeof(value)
+        sample = value[:: max(1, len(value) // SIZE_SAMPLE)][:SIZE_SAMPLE]
+        per_item = sum(_sizeof_event(v) if isinstance(v, dict) else sys.getsizeof(v) for v in sample) / len(sample)
+        return int(sys.getsizeof(value) + per_item * len(value))
+    return sys.getsizeof(value)
+
+
+def content_digest(value) -> str | None:
+    """
+    Empreinte du contenu d'un DataFrame (colonnes, types, valeurs), pour ne
+    stocker qu'une fois des données identiques (même Sheet lue par deux
+    utilisateurs...). Les `attrs` n'en font pas partie : ils sont conservés
+    par entrée. None pour les autres valeurs : pas de déduplication.
+    """
+    if not isinstance(value, pd.DataFrame):
+        return None
+    h = hashlib.sha256()
+    h.update(repr((list(value.columns), value.shape, [str(d) for d in value.dtypes])).encode())
+    h.update(pd.util.hash_pandas_object(value, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def credential_scope(creds) -> str:
+    """Portée propre à un compte Google (dérivée du refresh token, jamais stocké en clair)."""
+    secret = getattr(creds, "refresh_token", None) or getattr(creds, "token", None) or ""
+    return "user:" + hashlib.sha256(secret.encode()).hexdigest()[:32]
+
+
+def calendar_scope(calendar) -> str:
+    """
+    Portée d'un agenda, partagée par tous les comptes qui y ont le même
+    niveau d'accès. `calendar` est une entrée de list_calendars() du compte
+    courant : y figurer atteste l'accès (ACL vérifiée par Google).
+    """
+    level = _ROLE_LEVELS.get(calendar.get("accessRole"), "reader")
+    return f"calendar:{calendar['id']}:{level}"
+
+
+class SharedCache:
+    """
+    Cache de processus partagé par toutes les sessions Streamlit.
+
+    - Chaque entrée est rangée sous une portée (compte Google, ou agenda +
+      niveau d'accès) : une session ne lit que les portées qu'elle peut
+      présenter, donc jamais des données auxquelles son compte n'a pas accès.
+    - Les contenus identiques (même empreinte) ne sont stockés qu'une fois,
+      quelle que soit la portée ou la session qui les a produits. Les `attrs`
+      d'un DataFrame restent propres à chaque entrée (vue sans copie des données).
+    - Au-delà du budget mémoire, les entrées les moins récemment utilisées
+      sont évincées ; un contenu n'est libéré que lorsque plus aucune entrée
+      ne le référence.
+    - get_or_compute() ne lance qu'un calcul à la fois par clé : les sessions
+      concurrentes attendent le résultat au lieu de refaire l'appel.
+
+    Les valeurs partagées doivent être traitées en lecture seule.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_BUDGET_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (portée, clé) -> (empreinte, expiration, attrs)
+        self._blobs = {}               # empreinte -> [valeur, taille, nb de références]
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._key_locks = {}           # (portée, clé) -> [verrou, nb de détenteurs ou en attente]
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "dedup": 0}
+
+    # --- Lecture / écriture ---
+
+    def get(self, scope, key, default=None):
+        with self._lock:
+            entry = self._entries.get((scope, key))
+            if entry is None or (entry[1] is not None and entry[1] < time.monotonic()):
+                if entry is not None:
+                    self._drop((scope, key))
+                self.stats["misses"] += 1
+                return default
+            self._entries.move_to_end((scope, key))
+            self.stats["hits"] += 1
+            return _with_attrs(self._blobs[entry[0]][0], entry[2])
+
+    def put(self, scope, key, value, ttl=None, dedup=True):
+        """
+        Enregistre `value` et renvoie la valeur effectivement conservée (la
+        copie déjà en cache si un contenu identique existe). `ttl` en secondes.
+        Une valeur plus grosse que le budget n'est pas conservée.
+        """
+        digest = content_digest(value) if dedup else None
+        digest = digest or f"id:{id(value)}"
+        attrs = dict(value.attrs) if isinstance(value, pd.DataFrame) else None
+        expires = time.monotonic() + ttl if ttl else None
+
+        with self._lock:
+            if (scope, key) in self._entries:
+                self._drop((scope, key))
+            blob = self._blobs.get(digest)
+            if blob is not None:
+                self.stats["dedup"] += 1
+            else:
+                size = estimate_size(value)
+                if size > self.max_bytes:
+                    return value
+                blob = self._blobs[digest] = [value, size, 0]
+                self._bytes += size
+            blob[2] += 1
+            self._entries[(scope, key)] = (digest, expires, attrs)
+            self._evict()
+            return _with_attrs(blob[0], attrs)
+
+    def resize(self, scope, key):
+        """Réévalue la taille d'une valeur modifiée sur place (ex: FetchedRangeCache enrichi)."""
+        with self._lock:
+            entry = self._entries.get((scope, key))
+            if entry is None:
+                return
+            blob = self._blobs[entry[0]]
+            size = estimate_size(blob[0])
+            self._bytes += size - blob[1]
+            blob[1] = size
+            self._evict()
+
+    def get_or_compute(self, scope, key, compute, ttl=None, dedup=True):
+        value = self.get(scope, key, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self.lock(scope, key):
+            # Un calcul concurrent a pu aboutir pendant l'attente du verrou
+            value = self.get(scope, key, _MISSING)
+            if value is _MISSING:
+                value = self.put(scope, key, compute(), ttl=ttl, dedup=dedup)
+            return value
+
+    @contextmanager
+    def lock(self, scope, key):
+        """
+        Verrou exclusif sur une clé (calcul ou mise à jour d'une valeur partagée).
+        Il vit tant qu'un appelant le détient ou l'attend (compteur de références),
+        indépendamment de la présence de la valeur en cache.
+        """
+        with self._lock:
+            slot = self._key_locks.setdefault((scope, key), [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    del self._key_locks[(scope, key)]
+
+    def invalidate(self, scope, key=None):
+        """Supprime une entrée, ou toutes les entrées d'une portée."""
+        with self._lock:
+            targets = [(scope, key)] if key is not None else [k for k in self._entries if k[0] == scope]
+            for target in targets:
+                if target in self._entries:
+                    self._drop(target)
+
+    def info(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), blobs=len(self._blobs),
+                        bytes=self._bytes, max_bytes=self.max_bytes)
+
+    # --- Interne ---
+
+    def _drop(self, entry_key):
+        digest = self._entries.pop(entry_key)[0]
+        blob = self._blobs[digest]
+        blob[2] -= 1
+        if blob[2] == 0:
+            del self._blobs[digest]
+            self._bytes -= blob[1]
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+
+_MISSING = object()
+
+
+def _with_attrs(value, attrs):
+    # Contenu dédoublonné : chaque entrée présente ses propres attrs sur une vue sans copie
+    if attrs is None or value.attrs == attrs:
+        return value
+    view = value.copy(deep=False)
+    view.attrs = dict(attrs)
+    return view
+
+
+@st.cache_resource
+def get_shared_cache():
+    """Instance unique du cache, partagée entre toutes les sessions."""
+    budget_mb = int(os.environ.get("PATTERNCAL_CACHE_MB", DEFAULT_BUDGET_MB))
+    return SharedCache(max_bytes=budget_mb * 1024 * 1024)
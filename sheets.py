@@ -2,8 +2,13 @@ import re
 import pandas as pd
 from googleapiclient.discovery import build
 
-def get_sheets_service(creds):
-    """Retourne le service Sheets."""
+from instrumentation import execute
+from dtypes import compact_dtypes
+
+def get_sheets_service(creds, http=None):
+    """Retourne le service Sheets (transport `http` optionnel, ex: replay)."""
+    if http is not None:
+        return build('sheets', 'v4', http=http)
     service = build('sheets', 'v4', credentials=creds)
     return service
 
@@ -21,7 +26,7 @@ def get_sheet_data(service, spreadsheet_id, range_name="A:Z"):
     Suppose que la première ligne contient les headers.
     """
     sheet = service.spreadsheets()
-    result = sheet.values().get(spreadsheetId=spreadsheet_id, range=range_name).execute()
+    result = execute(sheet.values().get(spreadsheetId=spreadsheet_id, range=range_name))
     values = result.get('values', [])
 
     if not values:
@@ -46,4 +51,23 @@ def get_sheet_data(service, spreadsheet_id, range_name="A:Z"):
         final_data.append(row)
 
     df = pd.DataFrame(final_data, columns=header)
-    return df
+    return compact_dtypes(df)
+
+def enrichir_donnees(df_final, df_sheet):
+    """
+    Fusionne (left join) les données de la Sheet sur la première colonne commune.
+    Retourne (DataFrame enrichi, colonne pivot) ou (df_final, None) si aucune colonne commune.
+    """
+    # Intersection des colonnes
+    common = [c for c in df_final.columns if c in set(df_sheet.columns)]
+    if not common:
+        return df_final, None
+
+    pivot_col = common[0] # On prend la première trouvée
+    key = df_final[pivot_col]
+    if isinstance(key.dtype, pd.CategoricalDtype):
+        # Clé catégorielle des deux côtés (mêmes catégories) : la jointure se fait sur les codes.
+        # Les lignes de la Sheet hors catégories ne peuvent pas être jointes.
+        df_sheet = df_sheet[df_sheet[pivot_col].isin(key.cat.categories)]
+        df_sheet = df_sheet.astype({pivot_col: key.dtype})
+    return pd.merge(df_final, df_sheet, on=pivot_col, how='left'), pivot_col
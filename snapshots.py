@@ -0,0 +1,177 @@
+import os
+import json
+import hashlib
+import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+from datetimes import DEFAULT_TZ, normalize_events
+
+SNAPSHOT_DIR = os.path.join(".patterncal", "snapshots")
+
+EVENTS_FILE = "events.arrow"
+RESULT_FILE = "result.arrow"
+META_FILE = "meta.json"
+
+
+def rules_hash(regex_configs):
+    """Empreinte stable d'un jeu de règles d'extraction."""
+    payload = json.dumps(
+        [[c["name"], c["pattern"], c["type"]] for c in regex_configs], ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def snapshot_key(source, date_debut, date_fin, regex_configs, enrichment="", tz=DEFAULT_TZ, scopes=()):
+    """
+    Clé d'un snapshot : source, période, règles, (éventuelle) Sheet d'enrichissement,
+    fuseau et portées requises (deux niveaux d'accès ne partagent pas un snapshot).
+    """
+    payload = "|".join([
+        source, str(date_debut), str(date_fin), rules_hash(regex_configs), enrichment or "", tz,
+        *sorted(set(scopes)),
+    ])
+    return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+
+def events_to_frame(events, tz=DEFAULT_TZ):
+    """
+    Table normalisée des événements (datetimes.normalize_events) : instants
+    UTC, indicateur "journée entière" et durée en secondes.
+    """
+    temps = normalize_events(events, tz)
+    return pd.DataFrame({
+        "id": [e.get("id") for e in events],
+        "summary": [e["summary"] for e in events],
+        "dtstart": pd.to_datetime(temps["start_ns"], unit="ns", utc=True),
+        "dtend": pd.to_datetime(temps["end_ns"], unit="ns", utc=True),
+        "all_day": temps["all_day"],
+        "duration_s": temps["duration_s"],
+    })
+
+
+def _event_values(column, all_day, tz):
+    # Instant UTC pour les événements datés, date murale (dans `tz`) pour les journées entières.
+    # Les anciens snapshots stockaient l'heure murale sans fuseau : elle est rendue telle quelle.
+    instants = column.dt.to_pydatetime()
+    if column.dt.tz is None:
+        days = column.dt.date
+    else:
+        days = column.dt.tz_convert(tz).dt.date
+    return np.where(all_day, np.asarray(days, dtype=object), np.asarray(instants, dtype=object)).tolist()
+
+
+def frame_to_events(df, tz=DEFAULT_TZ):
+    """Reconstruit la liste de dicts attendue par extraire_informations_agenda."""
+    all_day = df["all_day"].to_numpy(dtype=bool)
+    starts = _event_values(df["dtstart"], all_day, tz)
+    ends = _event_values(df["dtend"], all_day, tz)
+    return [
+        {"id": evt_id, "summary": summary, "dtstart": start, "dtend": end}
+        for evt_id, summary, start, end in zip(df["id"].tolist(), df["summary"].tolist(), starts, ends)
+    ]
+
+
+def _write_arrow(df, path):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp_path = path + ".tmp"
+    # Format IPC non compressé : relisible par memory-map sans décodage
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+@st.cache_resource(max_entries=32)
+def _mapped_table(path, mtime):
+    """
+    Table Arrow adossée à un memory-map, partagée par toutes les sessions.
+    mtime fait partie de la clé pour invalider un fichier réécrit.
+    """
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+class SnapshotStore:
+    """
+    Stockage local des événements normalisés et des résultats (df_final) au
+    format Arrow IPC, un répertoire par clé de snapshot. Les fichiers sont
+    relus par memory-map : rouvrir un mois préparé (par soi ou un collègue
+    sur le même serveur) ne refait ni la récupération ni l'extraction.
+    """
+
+    def __init__(self, root=SNAPSHOT_DIR):
+        self.root = root
+
+    def _dir(self, key):
+        return os.path.join(self.root, key)
+
+    def exists(self, key):
+        return os.path.exists(os.path.join(self._dir(key), META_FILE))
+
+    def save(self, key, events, df_final, meta, scopes):
+        """
+        Enregistre un snapshot (événements, résultat et métadonnées). `scopes` :
+        portées (shared_cache / feed_scope) qu'une session doit toutes présenter
+        pour le voir et le relire.
+        """
+        if not scopes:
+            raise ValueError("Un snapshot doit être rattaché à au moins une portée d'accès.")
+        directory = self._dir(key)
+        os.makedirs(directory, exist_ok=True)
+        _write_arrow(events_to_frame(events, meta.get("tz", DEFAULT_TZ)), os.path.join(directory, EVENTS_FILE))
+        _write_arrow(df_final, os.path.join(directory, RESULT_FILE))
+
+        meta = dict(meta, key=key, scopes=sorted(set(scopes)), nb_events=len(events), nb_rows=len(df_final),
+                    created=datetime.datetime.now().isoformat(timespec="seconds"))
+        # Les métadonnées sont écrites en dernier : elles "publient" le snapshot
+        with open(os.path.join(directory, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2, default=str)
+        return meta
+
+    def _table(self, key, filename):
+        path = os.path.join(self._dir(key), filename)
+        return _mapped_table(path, os.path.getmtime(path))
+
+    def readable(self, meta, scopes):
+        """Vrai si la session présente toutes les portées requises par le snapshot."""
+        required = meta.get("scopes")
+        # Snapshot sans portée (format antérieur) : accessible à personne
+        return bool(required) and set(required) <= set(scopes)
+
+    def _check(self, key, scopes):
+        meta = self.meta(key)
+        if not self.readable(meta, scopes):
+            raise PermissionError(f"Snapshot {key} non accessible avec les accès de cette session.")
+        return meta
+
+    def load_result(self, key, scopes):
+        """df_final du snapshot (colonnes numériques sans null : zéro copie)."""
+        self._check(key, scopes)
+        return self._table(key, RESULT_FILE).to_pandas(split_blocks=True)
+
+    def meta(self, key):
+        with open(os.path.join(self._dir(key), META_FILE), encoding="utf-8") as f:
+            return json.load(f)
+
+    def load_events(self, key, scopes):
+        tz = self._check(key, scopes).get("tz", DEFAULT_TZ)
+        return frame_to_events(self._table(key, EVENTS_FILE).to_pandas(split_blocks=True), tz)
+
+    def list(self, scopes):
+        """
+        Métadonnées des snapshots accessibles avec les portées `scopes` de la
+        session, du plus récent au plus ancien. Sans portée : aucun snapshot.
+        """
+        if not scopes or not os.path.isdir(self.root):
+            return []
+        metas = []
+        for key in os.listdir(self.root):
+            meta_path = os.path.join(self._dir(key), META_FILE)
+            if os.path.exists(meta_path):
+                with open(meta_path, encoding="utf-8") as f:
+                    meta = json.load(f)
+                if self.readable(meta, scopes):
+                    metas.append(meta)
+        return sorted(metas, key=lambda m: m.get("created", ""), reverse=True)
@@ -44,7 +44,41 @@ TRANSLATIONS = {
         "tab_oauth": "☁️ Connexion Google",
         "connect_google": "Se connecter avec Google",
         "select_cal": "Sélectionnez un agenda",
-        "load_cal_btn": "Importer cet agenda"
+        "load_cal_btn": "Importer cet agenda",
+        "server_filter": "Pré-filtre côté Google (paramètre q)",
+        "group_by": "Regrouper par",
+        "drilldown_client": "Détail d'un client",
+        "dl_parquet": "📥 Télécharger Parquet",
+        "snapshots": "📦 Snapshots enregistrés",
+        "snapshot_select": "Choisir un snapshot",
+        "snapshot_item": "{} · {} → {} ({} événements)",
+        "snapshot_load": "Ouvrir ce snapshot",
+        "snapshot_save": "💾 Enregistrer un snapshot",
+        "snapshot_saved": "Snapshot enregistré.",
+        "snapshot_used": "Résultats chargés depuis un snapshot.",
+        "perf_enable": "Mesurer les performances",
+        "perf_panel": "⏱️ Performance",
+        "perf_stages": "Étapes du pipeline",
+        "perf_api": "Appels API Google",
+        "rule_risky": "⚠️ Motif risqué ({}) : exécution limitée dans le temps.",
+        "grid_search": "🔎 Rechercher",
+        "grid_sort": "Trier par",
+        "grid_descending": "Décroissant",
+        "grid_page_size": "Lignes / page",
+        "grid_page": "Page",
+        "grid_rows": "Lignes {} à {} sur {}",
+        "grid_all": "(Tous)",
+        "grid_total": "Total {} : {:.2f}",
+        "perf_cache": "Cache partagé : {:.1f} / {:.0f} Mo, {} entrées — {} succès, {} défauts, {} dédoublonnages, {} évictions",
+        "timezone": "Fuseau horaire de restitution",
+        "perf_memory": "Résultats : {:.1f} Mo → {:.1f} Mo après le plan de types (catégories, float32)",
+        "archive": "🗄️ Archive locale",
+        "archive_info": "{} mois archivés dont {} clos (immuables, jamais récupérés à nouveau) — {} événements",
+        "empty_value": "(vide)",
+        "server_filter_none": "Aucun (tous les événements)",
+        "server_filter_rule": "Événements de la règle « {} » seulement (recherche « {} »)",
+        "server_filter_warning": "Pré-filtre Google actif : seuls les événements contenant « {1} » sont récupérés. Les autres règles que « {0} », les KPI et les synthèses ne portent que sur ces événements.",
+        "server_filter_kpi": "Totaux limités aux événements contenant « {} » (pré-filtre Google)."
     },
     "en": {
         "page_title": "iCal Agenda Parser",
@@ -91,7 +125,41 @@ TRANSLATIONS = {
         "tab_oauth": "☁️ Google Connect",
         "connect_google": "Connect with Google",
         "select_cal": "Select an agenda",
-        "load_cal_btn": "Import this agenda"
+        "load_cal_btn": "Import this agenda",
+        "server_filter": "Google-side pre-filter (q parameter)",
+        "group_by": "Group by",
+        "drilldown_client": "Drill into a client",
+        "dl_parquet": "📥 Download Parquet",
+        "snapshots": "📦 Saved snapshots",
+        "snapshot_select": "Choose a snapshot",
+        "snapshot_item": "{} · {} → {} ({} events)",
+        "snapshot_load": "Open this snapshot",
+        "snapshot_save": "💾 Save a snapshot",
+        "snapshot_saved": "Snapshot saved.",
+        "snapshot_used": "Results loaded from a snapshot.",
+        "perf_enable": "Measure performance",
+        "perf_panel": "⏱️ Performance",
+        "perf_stages": "Pipeline stages",
+        "perf_api": "Google API calls",
+        "rule_risky": "⚠️ Risky pattern ({}): execution is time-limited.",
+        "grid_search": "🔎 Search",
+        "grid_sort": "Sort by",
+        "grid_descending": "Descending",
+        "grid_page_size": "Rows / page",
+        "grid_page": "Page",
+        "grid_rows": "Rows {} to {} of {}",
+        "grid_all": "(All)",
+        "grid_total": "Total {}: {:.2f}",
+        "perf_cache": "Shared cache: {:.1f} / {:.0f} MB, {} entries — {} hits, {} misses, {} dedups, {} evictions",
+        "timezone": "Reporting time zone",
+        "perf_memory": "Results: {:.1f} MB → {:.1f} MB after the dtype plan (categoricals, float32)",
+        "archive": "🗄️ Local archive",
+        "archive_info": "{} archived months, {} closed (immutable, never fetched again) — {} events",
+        "empty_value": "(empty)",
+        "server_filter_none": "None (all events)",
+        "server_filter_rule": "Only events of rule \"{}\" (search \"{}\")",
+        "server_filter_warning": "Google pre-filter on: only events containing \"{1}\" are fetched. Rules other than \"{0}\", KPIs and summaries only cover these events.",
+        "server_filter_kpi": "Totals limited to events containing \"{}\" (Google pre-filter)."
     },
     "es": {
         "page_title": "Analizador de Agenda iCal",
@@ -138,6 +206,40 @@ TRANSLATIONS = {
         "tab_oauth": "☁️ Conexión Google",
         "connect_google": "Conectarse con Google",
         "select_cal": "Seleccionar una agenda",
-        "load_cal_btn": "Importar esta agenda"
+        "load_cal_btn": "Importar esta agenda",
+        "server_filter": "Prefiltro en Google (parámetro q)",
+        "group_by": "Agrupar por",
+        "drilldown_client": "Detalle de un cliente",
+        "dl_parquet": "📥 Descargar Parquet",
+        "snapshots": "📦 Snapshots guardados",
+        "snapshot_select": "Elegir un snapshot",
+        "snapshot_item": "{} · {} → {} ({} eventos)",
+        "snapshot_load": "Abrir este snapshot",
+        "snapshot_save": "💾 Guardar un snapshot",
+        "snapshot_saved": "Snapshot guardado.",
+        "snapshot_used": "Resultados cargados desde un snapshot.",
+        "perf_enable": "Medir el rendimiento",
+        "perf_panel": "⏱️ Rendimiento",
+        "perf_stages": "Etapas del pipeline",
+        "perf_api": "Llamadas a la API de Google",
+        "rule_risky": "⚠️ Patrón arriesgado ({}): ejecución limitada en el tiempo.",
+        "grid_search": "🔎 Buscar",
+        "grid_sort": "Ordenar por",
+        "grid_descending": "Descendente",
+        "grid_page_size": "Filas / página",
+        "grid_page": "Página",
+        "grid_rows": "Filas {} a {} de {}",
+        "grid_all": "(Todos)",
+        "grid_total": "Total {}: {:.2f}",
+        "perf_cache": "Caché compartida: {:.1f} / {:.0f} MB, {} entradas — {} aciertos, {} fallos, {} deduplicaciones, {} desalojos",
+        "timezone": "Zona horaria de informe",
+        "perf_memory": "Resultados: {:.1f} MB → {:.1f} MB tras el plan de tipos (categorías, float32)",
+        "archive": "🗄️ Archivo local",
+        "archive_info": "{} meses archivados, {} cerrados (inmutables, nunca se vuelven a recuperar) — {} eventos",
+        "empty_value": "(vacío)",
+        "server_filter_none": "Ninguno (todos los eventos)",
+        "server_filter_rule": "Solo eventos de la regla «{}» (búsqueda «{}»)",
+        "server_filter_warning": "Prefiltro de Google activo: solo se obtienen los eventos que contienen «{1}». Las reglas distintas de «{0}», los KPI y las síntesis solo cubren estos eventos.",
+        "server_filter_kpi": "Totales limitados a los eventos que contienen «{}» (prefiltro de Google)."
     }
 }
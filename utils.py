@@ -1,10 +1,24 @@
+import itertools
 import icalendar
-from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
-import re
 import streamlit as st # Pour st.error si besoin, ou on lève une exception
 
+from datetimes import DEFAULT_TZ, normalize_events, local_dates
+from dtypes import compact_dtypes
+from rules import compile_rules, rule_budget, RuleBudget, RuleMatcher, RuleTimeout, RULE_SEARCH_TIMEOUT
+
+# Règles d'extraction par défaut (identiques au bouton "Réinitialiser" de l'app)
+REGLES_PAR_DEFAUT = [
+    {"name": "Client", "pattern": r"([A-ZÀ-ÿ][a-zà-ÿ]+(?:[\s-][A-ZÀ-ÿ][a-zà-ÿ]+)+)", "type": "text"},
+    {"name": "Montant", "pattern": r"(\d+([.,]\d{1,2})?)\s?(?:€|EUR)", "type": "number"},
+    {"name": "Projet", "pattern": r"Projet\s*:\s*(\w+)", "type": "text"},
+]
+
+# Nombre de VEVENT analysés ensemble par parse_ics_stream
+ICS_BATCH = 500
+
+
 def parse_ics(file_content: bytes, translations: dict = None) -> list[dict]:
     """
     Parse le contenu d'un fichier ICS et retourne une liste de dictionnaires
@@ -25,129 +39,230 @@ def parse_ics(file_content: bytes, translations: dict = None) -> list[dict]:
         raise ValueError(msg)
 
     events = []
+    for component in cal.walk("VEVENT"):
+        event = _vevent_dict(component)
+        if event is not None:
+            events.append(event)
+    return events
+
+
+def _vevent_dict(component) -> dict | None:
+    summary = str(component.get('summary'))
+    dtstart_prop = component.get('dtstart')
+    dtend_prop = component.get('dtend')
+
+    if not dtstart_prop:
+        return None
+
+    dtstart = dtstart_prop.dt
+    # Certains événements n'ont pas de dtend, on prend dtstart ou on ignore
+    if dtend_prop:
+        dtend = dtend_prop.dt
+    else:
+        dtend = dtstart
 
-    for component in cal.walk():
-        if component.name == "VEVENT":
-            summary = str(component.get('summary'))
-            dtstart_prop = component.get('dtstart')
-            dtend_prop = component.get('dtend')
-            
-            if not dtstart_prop:
+    # Fuseaux et durées sont traités par lot (datetimes.normalize_events)
+    return {
+        "summary": summary,
+        "dtstart": dtstart,
+        "dtend": dtend,
+    }
+
+
+def _unfolded_lines(chunks):
+    """Lignes de contenu ICS (octets) d'un flux de blocs, repliements RFC 5545 défaits."""
+    rest = b""
+    current = None
+    # Le saut de ligne final traite la dernière ligne si le flux n'en a pas
+    for chunk in itertools.chain(chunks, [b"\n"]):
+        lines = (rest + chunk).split(b"\n")
+        rest = lines.pop()
+        for line in lines:
+            line = line.rstrip(b"\r")
+            if line[:1] in (b" ", b"\t"):
+                # Ligne de continuation
+                if current is not None:
+                    current += line[1:]
                 continue
-                
-            dtstart = dtstart_prop.dt
-            # Certains événements n'ont pas de dtend, on prend dtstart ou on ignore
-            if dtend_prop:
-                dtend = dtend_prop.dt
-            else:
-                dtend = dtstart
-
-            # Calcul durée (gestion simplifiée des types dates/datetime)
-            duration = timedelta(0)
-            
-            # Cas 1: deux datetimes
-            if isinstance(dtstart, datetime) and isinstance(dtend, datetime):
-                 try:
-                     duration = dtend - dtstart
-                 except TypeError:
-                     # un des deux est naive, l'autre aware -> on rend tout naive
-                     duration = dtend.replace(tzinfo=None) - dtstart.replace(tzinfo=None)
-
-            # Cas 2: deux dates (all day event)
-            elif hasattr(dtstart, 'date') and hasattr(dtend, 'date'):
-                 delta = dtend - dtstart # donne timedelta
-                 duration = delta
-
-            events.append({
-                "summary": summary,
-                "dtstart": dtstart,
-                "dtend": dtend,
-                "duration": duration
-            })
-    return events
+            if current is not None:
+                yield current
+            current = line
+    if current is not None:
+        yield current
+
+
+def parse_ics_stream(chunks, batch_size: int = ICS_BATCH, translations: dict = None):
+    """
+    Variante de parse_ics pour un flux (téléchargement, gros fichier) : les
+    blocs d'octets sont découpés au fil de l'eau et les VEVENT analysés par
+    lots de `batch_size`, sans jamais conserver le fichier entier en mémoire.
+    Les VTIMEZONE rencontrées sont jointes à chaque lot (TZID personnalisés).
+    Générateur de listes d'événements, au format de parse_ics.
+
+    Lève ValueError si le flux ne commence pas par BEGIN:VCALENDAR (page HTML
+    de connexion, lien expiré...) : il ne doit pas passer pour un agenda vide.
+    """
+    timezones = []
+    block = None
+    batch = []
+    calendar = False
+    for line in _unfolded_lines(chunks):
+        upper = line.upper()
+        if not calendar:
+            # Première ligne non vide (BOM UTF-8 toléré)
+            if not upper.strip():
+                continue
+            if upper.removeprefix(b"\xef\xbb\xbf").strip() != b"BEGIN:VCALENDAR":
+                _raise_not_calendar(translations)
+            calendar = True
+            continue
+        if block is None:
+            if upper in (b"BEGIN:VEVENT", b"BEGIN:VTIMEZONE"):
+                block = [line]
+            continue
+        block.append(line)
+        if upper == b"END:VTIMEZONE" and block[0].upper() == b"BEGIN:VTIMEZONE":
+            timezones.append(b"\r\n".join(block))
+            block = None
+        elif upper == b"END:VEVENT":
+            batch.append(b"\r\n".join(block))
+            block = None
+            if len(batch) >= batch_size:
+                yield _parse_vevents(timezones, batch, translations)
+                batch = []
+    if not calendar:
+        _raise_not_calendar(translations)
+    if batch:
+        yield _parse_vevents(timezones, batch, translations)
+
+
+def _raise_not_calendar(translations=None):
+    reason = "contenu reçu sans BEGIN:VCALENDAR (page web ou lien invalide ?)"
+    msg = f"Erreur de lecture du fichier ICS: {reason}"
+    if translations and "error_load" in translations:
+        msg = translations["error_load"].format(reason)
+    raise ValueError(msg)
+
+
+def _parse_vevents(timezones, vevents, translations=None):
+    content = b"\r\n".join([b"BEGIN:VCALENDAR", *timezones, *vevents, b"END:VCALENDAR", b""])
+    return parse_ics(content, translations)
+
+
+def filtrer_evenements_periode(events: list[dict], date_debut, date_fin, tz: str = DEFAULT_TZ) -> list[dict]:
+    """
+    Garde les événements dont la date de début (dans le fuseau `tz`) est dans
+    [date_debut, date_fin] (bornes incluses, None = pas de borne).
+    """
+    if not events:
+        return []
+    jours = local_dates(events, tz)
+    in_range = ~np.isnat(jours)
+    if date_debut:
+        in_range &= jours >= np.datetime64(date_debut, "D")
+    if date_fin:
+        in_range &= jours <= np.datetime64(date_fin, "D")
+    return [events[i] for i in np.flatnonzero(in_range)]
 
 
 def extraire_informations_agenda(
     events: list[dict], 
-    regex_configs: list[dict]
+    regex_configs: list[dict],
+    time_budget: float | None = None,
+    tz: str = DEFAULT_TZ
 ) -> pd.DataFrame:
     """
     Analyse les 'summary' des événements ICS avec les Regex dynamiques et enrichit les données.
+    "Date" est l'heure de début dans le fuseau de restitution `tz` (sans fuseau, pour Excel).
+    Les colonnes suivent le plan de types compact (dtypes.compact_dtypes).
+
+    Chaque recherche est bornée à RULE_SEARCH_TIMEOUT secondes et chaque règle
+    dispose d'un budget de `time_budget` secondes pour l'ensemble du lot (par
+    défaut proportionnel au nombre d'événements, voir rules.rule_budget). Au
+    premier dépassement, la règle est désactivée : sa colonne est vide pour
+    tout le lot et la raison est reportée dans `df.attrs["regles_desactivees"]`
+    ({nom: message}).
     """
     
-    # Compilation des regex
+    # Compilation des regex (avec analyse de complexité)
     compiled_regexes = {}
-    for config in regex_configs:
-        try:
-            flag = re.IGNORECASE if config["type"] == "number" else 0 
-            compiled_regexes[config["name"]] = {
-                "regex": re.compile(config["pattern"], flag),
-                "type": config["type"]
-            }
-        except re.error:
-            continue
+    regles_desactivees = {}
+    for rule in compile_rules(regex_configs):
+        compiled_regexes[rule["name"]] = rule
+        if rule["disabled"]:
+            regles_desactivees[rule["name"]] = rule["disabled"]
+    if time_budget is None:
+        time_budget = rule_budget(len(events))
+    budgets = {name: RuleBudget(rule, time_budget) for name, rule in compiled_regexes.items()}
+
+    # Préfiltre : seules les règles dont un littéral obligatoire figure dans le titre sont tentées
+    matcher = RuleMatcher(r for name, r in compiled_regexes.items() if name not in regles_desactivees)
+    valeurs_vides = {
+        name: np.nan if rule["type"] == "number" else None
+        for name, rule in compiled_regexes.items()
+    }
 
     donnees_traitees = []
 
     for event in events:
         titre = event["summary"]
-        
-        # Normalisation Date : Tout en datetime naive
-        dt = event["dtstart"]
-        
-        # 1. Si c'est une date pure, on convertit en datetime minuit
-        if type(dt) is datetime.date: # Attention, datetime herite de date, d'ouv type()
-             dt = datetime.combine(dt, datetime.min.time())
-        
-        # 2. Si c'est un datetime, on retire la timezone (Excel aime pas trop non plus)
-        if isinstance(dt, datetime) and dt.tzinfo:
-             dt = dt.replace(tzinfo=None)
              
-        # Base de l'entrée
+        # Base de l'entrée (Date et durée sont calculées par lot plus bas)
         entry = {
-            "Date": dt,
             "Titre": titre,
+            **valeurs_vides,
         }
         
-        # Extraction dynamique
-        for name, processor in compiled_regexes.items():
-            match = processor["regex"].search(titre)
-            valeur = None
-            
-            if match:
-                val_str = match.group(1) if match.groups() else match.group(0)
+        # Extraction dynamique : règles sûres en une seule recherche combinée, les autres une à une
+        candidats = [r for r in matcher.candidates(titre) if r["name"] not in regles_desactivees]
+        fusion = [r for r in candidats if r["mergeable"]]
+        valeurs = matcher.search_merged(titre, fusion) if len(fusion) > 1 else None
+        for processor in candidats:
+            name = processor["name"]
+            val_str = None
+            if valeurs is not None and name in valeurs:
+                val_str = valeurs[name]
+            elif name not in regles_desactivees:
+                try:
+                    match = budgets[name].search(titre)
+                except RuleTimeout:
+                    match = None
+                    regles_desactivees[name] = (
+                        f"Règle '{name}' désactivée : recherche de plus de {RULE_SEARCH_TIMEOUT:g} s "
+                        f"ou budget de {time_budget:g} s dépassé (expression trop coûteuse, "
+                        f"risque de backtracking catastrophique)."
+                    )
+                if match:
+                    val_str = match.group(1) if match.groups() else match.group(0)
+            if val_str is not None:
                 if processor["type"] == "number":
                     val_str = val_str.replace(',', '.')
                     try:
-                        valeur = float(val_str)
+                        entry[name] = float(val_str)
                     except ValueError:
-                        valeur = np.nan
+                        entry[name] = np.nan
                 else:
-                    valeur = val_str.strip()
-            
-            if processor["type"] == "number" and valeur is None:
-                valeur = np.nan
-                
-            entry[name] = valeur
-
-        # Formatage durée
-        duree_td = event["duration"]
-        duree_heures = duree_td.total_seconds() / 3600 if isinstance(duree_td, timedelta) else 0.0
-        
-        entry["Durée (h)"] = round(duree_heures, 2)
+                    entry[name] = val_str.strip()
         
         donnees_traitees.append(entry)
 
     df = pd.DataFrame(donnees_traitees)
+    # Règle désactivée en cours de lot : colonne entièrement vide plutôt qu'à moitié remplie
+    for name in regles_desactivees:
+        if name in df.columns:
+            df[name] = valeurs_vides[name]
+    df.attrs["regles_desactivees"] = regles_desactivees
     
     if not df.empty:
-        # Force la conversion en datetime pour éviter les erreurs PyArrow
-        # On force tout en datetime ns (standard pandas)
-        df["Date"] = pd.to_datetime(df["Date"])
+        # Normalisation temporelle vectorisée : fuseaux, journées entières, durées
+        temps = normalize_events(events, tz)
+        df["Date"] = temps["date"].to_numpy()
+        df["Durée (h)"] = np.round(temps["duration_s"].to_numpy() / 3600, 2)
 
         dynamic_cols = [c["name"] for c in regex_configs]
         cols_order = ["Date", "Titre"] + dynamic_cols + ["Durée (h)"]
         final_cols = [c for c in cols_order if c in df.columns]
-        return df[final_cols]
+        # Plan de types compact : catégories pour les règles texte répétitives, float32 sans perte
+        return compact_dtypes(df[final_cols])
         
     return df